@@ -0,0 +1,108 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold=0.95, max_entries=1000, ttl_seconds=3600.0):
+        """
+        In-memory cache of query results keyed by query embedding. A lookup hits when a cached query of
+        the same graph version is at least `threshold` cosine-similar to the new one, so repeated and
+        closely paraphrased questions skip retrieval, traversal and the LLM calls. Entries expire after
+        ttl_seconds (None disables expiry), the least recently used entry is evicted beyond max_entries,
+        and everything is dropped when the graph version changes. All public methods hold a lock, so one
+        cache can be shared by several threads (e.g. Streamlit sessions).
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.graph_version = None
+        self.entries = OrderedDict()
+        self._next_key = 0
+        self._keys = []
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(query_embedding):
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _sync_version(self, graph_version):
+        if graph_version != self.graph_version:
+            self._clear()
+            self.graph_version = graph_version
+
+    def _remove(self, key):
+        del self.entries[key]
+        self._matrix = None
+
+    def _expire(self):
+        if self.ttl_seconds is None:
+            return
+        deadline = time.monotonic() - self.ttl_seconds
+        for key in [key for key, entry in self.entries.items() if entry["created_at"] < deadline]:
+            self._remove(key)
+            self.evictions += 1
+
+    def get(self, query_embedding, graph_version):
+        """
+        Returns the cached (answer, traversal_path, filtered_content) of the most similar cached query,
+        or None when no cached query reaches the threshold.
+        """
+        with self._lock:
+            self._sync_version(graph_version)
+            self._expire()
+            if not self.entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._keys = list(self.entries)
+                self._matrix = np.stack([self.entries[key]["embedding"] for key in self._keys])
+            similarities = self._matrix @ self._normalize(query_embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            key = self._keys[best]
+            self.entries.move_to_end(key)
+            self.hits += 1
+            answer, traversal_path, filtered_content = self.entries[key]["value"]
+            return answer, list(traversal_path), dict(filtered_content)
+
+    def set(self, query_embedding, graph_version, value):
+        """
+        Caches the (answer, traversal_path, filtered_content) result of a query.
+        """
+        with self._lock:
+            self._sync_version(graph_version)
+            answer, traversal_path, filtered_content = value
+            self.entries[self._next_key] = {"embedding": self._normalize(query_embedding),
+                                            "created_at": time.monotonic(),
+                                            "value": (answer, list(traversal_path), dict(filtered_content))}
+            self._next_key += 1
+            self._matrix = None
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self.entries.clear()
+        self._keys = []
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,113 @@
+import numpy as np
+
+
+class TraversalState:
+    def __init__(self, query, query_embedding=None):
+        """
+        Per-traversal counters the answer-check policy decides on. A new state is created for every
+        query, so policies themselves hold no per-query state.
+        """
+        self.query = query
+        self.query_embedding = None if query_embedding is None else np.asarray(query_embedding, dtype=np.float32)
+        self.nodes_visited = 0
+        self.nodes_since_check = 0
+        self.tokens_since_check = 0
+        self.context_embedding = None
+        self.llm_checks = 0
+        self.llm_checks_saved = 0
+
+    def record_node(self, tokens, embedding=None):
+        """
+        Records a node added to the context, with its token count and (optionally) its embedding.
+        """
+        self.nodes_visited += 1
+        self.nodes_since_check += 1
+        self.tokens_since_check += tokens
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            self.context_embedding = embedding.copy() if self.context_embedding is None \
+                else self.context_embedding + embedding
+
+    def record_check(self):
+        self.llm_checks += 1
+        self.nodes_since_check = 0
+        self.tokens_since_check = 0
+
+    def record_skip(self):
+        self.llm_checks_saved += 1
+
+    def context_similarity(self):
+        """
+        Cosine similarity between the query and the sum of the visited nodes' embeddings, or None when
+        either is unavailable.
+        """
+        if self.query_embedding is None or self.context_embedding is None:
+            return None
+        norm = float(np.linalg.norm(self.query_embedding) * np.linalg.norm(self.context_embedding))
+        return float(self.query_embedding @ self.context_embedding) / norm if norm else 0.0
+
+    def stats(self):
+        return {"nodes_visited": self.nodes_visited, "llm_checks": self.llm_checks,
+                "llm_checks_saved": self.llm_checks_saved}
+
+
+class AnswerCheckPolicy:
+    """
+    Decides, after each node is added to the context, whether to ask the LLM if the context already
+    answers the query.
+    """
+    name = "base"
+
+    def should_check(self, state):
+        raise NotImplementedError
+
+
+class AlwaysCheckPolicy(AnswerCheckPolicy):
+    """
+    Checks after every node.
+    """
+    name = "always"
+
+    def should_check(self, state):
+        return True
+
+
+class EveryKNodesPolicy(AnswerCheckPolicy):
+    """
+    Checks once every k newly visited nodes.
+    """
+    name = "every_k_nodes"
+
+    def __init__(self, k=5):
+        self.k = k
+
+    def should_check(self, state):
+        return state.nodes_since_check >= self.k
+
+
+class TokenThresholdPolicy(AnswerCheckPolicy):
+    """
+    Checks once the context added since the last check reaches min_new_tokens tokens.
+    """
+    name = "token_threshold"
+
+    def __init__(self, min_new_tokens=500):
+        self.min_new_tokens = min_new_tokens
+
+    def should_check(self, state):
+        return state.tokens_since_check >= self.min_new_tokens
+
+
+class EmbeddingSimilarityPolicy(AnswerCheckPolicy):
+    """
+    Checks only when the accumulated context embedding is at least `cutoff` cosine-similar to the query.
+    Without a query embedding it falls back to checking every node.
+    """
+    name = "embedding_similarity"
+
+    def __init__(self, cutoff=0.6):
+        self.cutoff = cutoff
+
+    def should_check(self, state):
+        similarity = state.context_similarity()
+        return similarity is None or similarity >= self.cutoff
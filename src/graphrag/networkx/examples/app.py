@@ -1,23 +1,51 @@
-
+import os
+import shutil
+import hashlib
 import streamlit as st
-import matplotlib.pyplot as plt
-from PyPDF2 import PdfReader
-from langchain.schema import Document
-import networkx as nx
+import streamlit.components.v1 as components
 
 from graph_rag import GraphRAG  # Import your GraphRAG class
 from visualizer import Visualizer  # Import Visualizer for plotting
+from query_events import SeedsSelected, NodeVisited, AnswerChecked, AnswerToken, QueryCompleted
+from graph_snapshot import MANIFEST_FILE
+from pdf_extraction import PDFExtractor
 
 
 # Initialize global variables
 graph_rag = None
+# Graphs with more nodes than this are drawn with the browser renderer instead of matplotlib
+LARGE_GRAPH_NODES = 500
+# Each uploaded PDF gets a snapshot and a Chroma directory here, named after its content hash
+PDF_CACHE_DIRECTORY = "../../../data/graph_cache/pdfs"
 
 # Function to process uploaded PDF
 def process_pdf(file):
-    pdf_reader = PdfReader(file)
-    # Read content from all pages
-    documents = [Document(page_content=page.extract_text()) for page in pdf_reader.pages]
-    return documents
+    # Pages are extracted by a process pool and streamed in order, so splitting starts with the first pages
+    return PDFExtractor().iter_pages(file)
+
+@st.cache_resource(show_spinner=False)
+def load_graph_rag(pdf_hash, _pdf_bytes):
+    """
+    Returns the GraphRAG for a PDF, kept across Streamlit reruns and keyed by the PDF's content hash
+    (the bytes themselves are not hashed by Streamlit). A PDF seen by an earlier process is opened from
+    its saved snapshot and Chroma directory; a new one is built once and saved.
+    """
+    directory = os.path.join(PDF_CACHE_DIRECTORY, pdf_hash)
+    snapshot_path = os.path.join(directory, "snapshot")
+    persist_directory = os.path.join(directory, "chroma")
+    if os.path.exists(os.path.join(snapshot_path, MANIFEST_FILE)):
+        return GraphRAG.load(snapshot_path, persist_directory)
+
+    # A build interrupted before its snapshot was saved may have left chunks in the vector store
+    shutil.rmtree(persist_directory, ignore_errors=True)
+    graph_rag = GraphRAG(persist_directory=persist_directory)
+    # Splitting, embedding and concept extraction overlap, batch by batch, instead of running one after another
+    for _ in graph_rag.ingest(process_pdf(_pdf_bytes)):
+        pass
+    # Save the layout with the snapshot, so reopening the PDF draws without recomputing it
+    graph_rag.knowledge_graph.layout()
+    graph_rag.save(snapshot_path)
+    return graph_rag
 
 # Set up the main Streamlit UI
 st.title("Knowledge Graph from PDF with LLM")
@@ -26,22 +54,35 @@ st.title("Knowledge Graph from PDF with LLM")
 uploaded_file = st.file_uploader("Upload a PDF file", type=["pdf"])
 
 if uploaded_file is not None:
-    # Process the uploaded PDF
-    documents = process_pdf(uploaded_file)
-    st.write(f"Uploaded **{uploaded_file.name}** with **{len(documents)} pages** processed.")
+    pdf_bytes = uploaded_file.getvalue()
+    pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
 
-    # Initialize GraphRAG with the processed documents
+    # Build the GraphRAG once per PDF; later reruns and queries reuse it
     with st.spinner("Processing the PDF and building the knowledge graph..."):
-        graph_rag = GraphRAG(documents)
+        graph_rag = load_graph_rag(pdf_hash, pdf_bytes)
+    # The graph view of a reopened snapshot is array-backed; .graph would rebuild the whole nx.Graph
+    num_nodes = graph_rag.knowledge_graph.graph_view().number_of_nodes()
+    st.write(f"Uploaded **{uploaded_file.name}**: knowledge graph with **{num_nodes} chunks**.")
     st.success("PDF has been processed and the knowledge graph has been created.")
 
     # Visualization Section
     st.write("### Knowledge Graph Visualization")
-    fig, ax = plt.subplots(figsize=(12, 8))
-    pos = nx.spring_layout(graph_rag.knowledge_graph.graph, k=1, iterations=50)
-    nx.draw(graph_rag.knowledge_graph.graph, pos, with_labels=True, ax=ax,
-            node_size=500, node_color="lightblue", edge_color="gray")
-    st.pyplot(fig)
+    # Positions are computed once per graph version and reused by every later drawing
+    positions = graph_rag.knowledge_graph.layout()
+    if num_nodes > LARGE_GRAPH_NODES:
+        # Matplotlib cannot usefully draw large graphs; send positions and the strongest edges to the browser
+        payload = Visualizer.graph_payload(graph_rag.knowledge_graph.graph_view(), positions)
+        html = Visualizer.vis_network_html(payload)
+        if html is not None:
+            components.html(html, height=620)
+        else:
+            # No local vis-network script: draw the edge density image instead
+            st.caption("Interactive view unavailable: static/vis-network.min.js is missing (see the README).")
+            fig, ax = Visualizer.visualize_density(graph_rag.knowledge_graph.graph_view(), positions)
+            st.pyplot(fig)
+    else:
+        fig, ax = Visualizer.visualize_graph(graph_rag.knowledge_graph.graph, pos=positions)
+        st.pyplot(fig)
 
 # Query section
 if graph_rag is not None:
@@ -49,20 +90,43 @@ if graph_rag is not None:
     query = st.text_input("Enter your query", "What is the main cause of climate change?")
 
     if st.button("Submit Query"):
-        with st.spinner("Processing your query..."):
-            response, traversal_path, filtered_content = graph_rag.query(query)
-            st.write("### Response to your query:")
-            st.write(response)
-
-            # Visualize traversal
-            st.write("### Traversal Path Visualization")
-            fig, ax = Visualizer.visualize_traversal(graph_rag.knowledge_graph.graph, traversal_path)
-            st.pyplot(fig)
+        st.write("### Response to your query:")
+        answer_placeholder = st.empty()
+        traversal_status = st.status("Traversing the knowledge graph...", expanded=True)
+        answer = ""
+        traversal_path, filtered_content = [], {}
+
+        # Render the traversal and the answer as the events arrive
+        for event in graph_rag.stream_query(query):
+            if isinstance(event, SeedsSelected):
+                traversal_status.write(f"Starting from nodes {[node for node, _ in event.seeds]}")
+            elif isinstance(event, NodeVisited):
+                traversal_status.write(f"Step {event.step} - visited node {event.node} "
+                                       f"({event.context_tokens} context tokens)")
+            elif isinstance(event, AnswerChecked):
+                traversal_status.write(f"Node {event.node}: answer is "
+                                       f"{'complete' if event.is_complete else 'incomplete'}")
+            elif isinstance(event, AnswerToken):
+                answer += event.text
+                answer_placeholder.markdown(answer)
+            elif isinstance(event, QueryCompleted):
+                traversal_path, filtered_content = event.traversal_path, event.filtered_content
+                answer_placeholder.markdown(event.answer)
+        traversal_status.update(label=f"Traversed {len(traversal_path)} nodes", state="complete", expanded=False)
+
+        # Visualize traversal
+        st.write("### Traversal Path Visualization")
+        if num_nodes > LARGE_GRAPH_NODES:
+            fig, ax = Visualizer.visualize_density(graph_rag.knowledge_graph.graph_view(), positions, traversal_path)
+        else:
+            fig, ax = Visualizer.visualize_traversal(graph_rag.knowledge_graph.graph, traversal_path,
+                                                     pos=positions, hops=1)
+        st.pyplot(fig)
 
-            # Show traversal logic
-            st.write("### Traversal Logic and Filtered Content")
-            for i, node in enumerate(traversal_path):
-                st.write(f"**Step {i + 1} - Node {node}:**")
-                content = filtered_content.get(node, 'No content available')
-                st.write(content)
-                st.write("---")
+        # Show traversal logic
+        st.write("### Traversal Logic and Filtered Content")
+        for i, node in enumerate(traversal_path):
+            st.write(f"**Step {i + 1} - Node {node}:**")
+            content = filtered_content.get(node, 'No content available')
+            st.write(content)
+            st.write("---")
@@ -0,0 +1,453 @@
+import io
+import json
+import time
+import asyncio
+import heapq
+import tracemalloc
+import numpy as np
+import networkx as nx
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from knowledge_graph import KnowledgeGraph
+from compact_graph import CompactGraph, NetworkXGraphView
+from query_engine import QueryEngine
+from visualizer import Visualizer
+
+
+def make_synthetic_chunks(num_nodes, dim=384, num_concepts=2000, concepts_per_node=8, seed=0):
+    """
+    Creates clustered embeddings and random concept lists that mimic a chunked PDF. Each concept is
+    written in the singular or the plural at random ("concept 12" / "concepts 12"), so nodes share a
+    concept only after lemmatization, as with concepts extracted by the LLM.
+    """
+    rng = np.random.default_rng(seed)
+    num_clusters = max(1, num_nodes // 25)
+    centers = rng.standard_normal((num_clusters, dim))
+    assignments = rng.integers(0, num_clusters, size=num_nodes)
+    embeddings = centers[assignments] + 0.45 * rng.standard_normal((num_nodes, dim))
+    concepts = [[f"{rng.choice(('concept', 'concepts'))} {c}"
+                 for c in rng.choice(num_concepts, size=concepts_per_node, replace=False)]
+                for _ in range(num_nodes)]
+    return embeddings.astype(np.float32), concepts
+
+
+def make_knowledge_graph(embeddings, concepts):
+    """
+    Creates a KnowledgeGraph with nodes and concepts already populated, skipping the LLM stages.
+    """
+    knowledge_graph = KnowledgeGraph()
+    for i, node_concepts in enumerate(concepts):
+        knowledge_graph.graph.add_node(i, content=f"chunk {i}", concepts=node_concepts)
+    knowledge_graph._build_concept_index()
+    return knowledge_graph
+
+
+def _legacy_add_edges(knowledge_graph, embeddings):
+    """
+    The original nested-loop edge construction, kept as the benchmark baseline and as the reference the
+    blocked builder is checked against. Concepts are compared after lemmatization, like the incidence matrix
+    does, so "concepts 12" and "concept 12" count as one shared concept.
+    """
+    graph = knowledge_graph.graph
+    similarity_matrix = knowledge_graph._compute_similarities(embeddings)
+    num_nodes = len(graph.nodes)
+    lemmatized = [{knowledge_graph._lemmatize_concept(concept) for concept in graph.nodes[node]['concepts']} - {''}
+                  for node in range(num_nodes)]
+    for node1 in range(num_nodes):
+        for node2 in range(node1 + 1, num_nodes):
+            similarity_score = similarity_matrix[node1][node2]
+            if similarity_score > knowledge_graph.edges_threshold:
+                shared_concepts = lemmatized[node1] & lemmatized[node2]
+                max_possible_shared = min(len(lemmatized[node1]), len(lemmatized[node2]))
+                normalized = len(shared_concepts) / max_possible_shared if max_possible_shared > 0 else 0
+                graph.add_edge(node1, node2, weight=0.7 * similarity_score + 0.3 * normalized,
+                               similarity=similarity_score, shared_concept_count=len(shared_concepts))
+
+
+def benchmark_add_edges(sizes=(1000, 10000, 50000), legacy_max_nodes=10000, debug=False):
+    """
+    Times the blocked edge builder against the legacy nested loop and checks both produce the same edges.
+    The legacy loop needs the full N x N matrix, so it is skipped above legacy_max_nodes.
+    """
+    results = []
+    for num_nodes in sizes:
+        embeddings, concepts = make_synthetic_chunks(num_nodes)
+
+        knowledge_graph = make_knowledge_graph(embeddings, concepts)
+        knowledge_graph._compute_similarities(embeddings[:2])  # warm up the sklearn import
+        start = time.perf_counter()
+        knowledge_graph._add_edges(embeddings)
+        blocked_seconds = time.perf_counter() - start
+        result = {"nodes": num_nodes, "edges": knowledge_graph.graph.number_of_edges(),
+                  "blocked_seconds": blocked_seconds, "legacy_seconds": None, "speedup": None,
+                  "edges_match": None}
+
+        if num_nodes <= legacy_max_nodes:
+            legacy_graph = make_knowledge_graph(embeddings, concepts)
+            start = time.perf_counter()
+            _legacy_add_edges(legacy_graph, embeddings)
+            result["legacy_seconds"] = time.perf_counter() - start
+            result["speedup"] = result["legacy_seconds"] / blocked_seconds
+            result["edges_match"] = nx.utils.edges_equal(legacy_graph.graph.edges(data='weight'),
+                                                         knowledge_graph.graph.edges(data='weight'))
+
+        results.append(result)
+        if debug:
+            print(result)
+    return results
+
+
+def _exact_knn_pairs(embeddings, k, threshold, block_size=256):
+    """
+    Brute-force top-k neighbour pairs above the threshold, the ceiling the knn mode can reach.
+    """
+    vectors = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    pairs = set()
+    for start in range(0, len(vectors), block_size):
+        scores = vectors[start:start + block_size] @ vectors.T
+        for offset, row_scores in enumerate(scores):
+            node = start + offset
+            row_scores[node] = -np.inf
+            top = np.argpartition(-row_scores, k)[:k]
+            pairs.update((min(node, n), max(node, n)) for n in top.tolist() if row_scores[n] > threshold)
+    return pairs
+
+
+def benchmark_knn_recall(sizes=(1000, 10000, 50000), knn_k=10, debug=False):
+    """
+    Compares the knn similarity mode against the exact blocked scan. recall is measured against the
+    full exact edge set and top_k_recall against the exact top-k graph the index approximates;
+    the peak_scores fields count the similarity scores each mode holds in memory at once.
+    """
+    results = []
+    for num_nodes in sizes:
+        embeddings, _ = make_synthetic_chunks(num_nodes)
+        exact_graph = KnowledgeGraph(similarity_mode="exact")
+        knn_graph = KnowledgeGraph(similarity_mode="knn", knn_k=knn_k)
+
+        start = time.perf_counter()
+        exact_rows, exact_cols, _ = exact_graph._similar_pairs(embeddings)
+        exact_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        knn_rows, knn_cols, _ = knn_graph._similar_pairs(embeddings)
+        knn_seconds = time.perf_counter() - start
+
+        exact_edges = set(zip(exact_rows.tolist(), exact_cols.tolist()))
+        knn_edges = set(zip(knn_rows.tolist(), knn_cols.tolist()))
+        top_k_edges = _exact_knn_pairs(embeddings, knn_k, knn_graph.edges_threshold)
+        result = {"nodes": num_nodes, "exact_edges": len(exact_edges), "knn_edges": len(knn_edges),
+                  "recall": len(exact_edges & knn_edges) / len(exact_edges) if exact_edges else 1.0,
+                  "top_k_recall": len(top_k_edges & knn_edges) / len(top_k_edges) if top_k_edges else 1.0,
+                  "exact_seconds": exact_seconds, "knn_seconds": knn_seconds,
+                  "exact_peak_scores": exact_graph.edge_block_size * num_nodes,
+                  "knn_peak_scores": num_nodes * (knn_k + 1)}
+        results.append(result)
+        if debug:
+            print(result)
+    return results
+
+
+def make_random_graph(num_nodes, degree=10, dim=384, seed=0):
+    """
+    Creates a KnowledgeGraph with random edges and concepts without running the similarity scan,
+    for benchmarks that need a large graph quickly.
+    """
+    rng = np.random.default_rng(seed)
+    embeddings, concepts = make_synthetic_chunks(num_nodes, dim=dim, seed=seed)
+    knowledge_graph = make_knowledge_graph(embeddings, concepts)
+    knowledge_graph.embeddings = embeddings
+    rows = np.repeat(np.arange(num_nodes), degree // 2)
+    cols = rng.integers(0, num_nodes, size=len(rows))
+    weights = rng.uniform(0.5, 1.0, size=len(rows))
+    knowledge_graph.graph.add_edges_from(
+        (u, v, {'weight': w, 'similarity': w, 'shared_concept_count': 1})
+        for u, v, w in zip(rows.tolist(), cols.tolist(), weights.tolist()) if u != v
+    )
+    return knowledge_graph
+
+
+def benchmark_snapshot_load(num_nodes=100_000, path="../../../data/graph_snapshots/benchmark", debug=False):
+    """
+    Saves a num_nodes graph as a snapshot and times KnowledgeGraph.load, the first content lookup
+    and the full nx.Graph materialization.
+    """
+    knowledge_graph = make_random_graph(num_nodes)
+    start = time.perf_counter()
+    knowledge_graph.save(path)
+    save_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = KnowledgeGraph.load(path)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    loaded.snapshot.contents[num_nodes // 2]
+    first_lookup_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    loaded.graph
+    materialize_seconds = time.perf_counter() - start
+
+    result = {"nodes": num_nodes, "edges": knowledge_graph.graph.number_of_edges(), "save_seconds": save_seconds,
+              "load_seconds": load_seconds, "first_lookup_seconds": first_lookup_seconds,
+              "materialize_seconds": materialize_seconds,
+              "edges_match": nx.utils.edges_equal(knowledge_graph.graph.edges(), loaded.graph.edges())}
+    if debug:
+        print(result)
+    return result
+
+
+def _traverse(graph_view, seeds, max_nodes):
+    """
+    The QueryEngine traversal loop without the LLM calls: Dijkstra over 1 / weight from the seeds,
+    reading each visited node's content.
+    """
+    priority_queue = [(1.0, seed) for seed in seeds]
+    distances = {seed: 1.0 for seed in seeds}
+    visited = set()
+    while priority_queue and len(visited) < max_nodes:
+        current_priority, current_node = heapq.heappop(priority_queue)
+        if current_priority > distances.get(current_node, float('inf')) or current_node in visited:
+            continue
+        visited.add(current_node)
+        graph_view.content(current_node)
+        for neighbor, edge_weight in graph_view.weighted_neighbors(current_node):
+            distance = current_priority + 1 / edge_weight
+            if distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = distance
+                heapq.heappush(priority_queue, (distance, neighbor))
+    return len(visited)
+
+
+def benchmark_compact_graph(num_nodes=100_000, traversals=200, max_nodes=30, debug=False):
+    """
+    Compares the compact backend with NetworkX: time per traversal of max_nodes nodes and memory per
+    node, measured with tracemalloc while each representation is built.
+    """
+    knowledge_graph = make_random_graph(num_nodes)
+    graph = knowledge_graph.graph
+
+    tracemalloc.start()
+    rebuilt = nx.Graph()
+    rebuilt.add_nodes_from(graph.nodes(data=True))
+    rebuilt.add_edges_from(graph.edges(data=True))
+    networkx_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    compact = CompactGraph.from_networkx(graph)
+
+    rng = np.random.default_rng(0)
+    seeds = rng.integers(0, num_nodes, size=(traversals, 5)).tolist()
+    result = {"nodes": num_nodes, "edges": graph.number_of_edges(),
+              "networkx_bytes_per_node": networkx_bytes / num_nodes,
+              "compact_bytes_per_node": compact.nbytes / num_nodes}
+    for name, view in (("networkx", NetworkXGraphView(graph)), ("compact", compact)):
+        start = time.perf_counter()
+        for traversal_seeds in seeds:
+            _traverse(view, traversal_seeds, max_nodes)
+        result[f"{name}_ms_per_traversal"] = 1000 * (time.perf_counter() - start) / traversals
+    if debug:
+        print(result)
+    return result
+
+
+class CountingEmbeddings:
+    def __init__(self, embeddings):
+        """
+        Wraps an embedding model and counts how many texts go through it.
+        """
+        self.embeddings = embeddings
+        self.query_calls = 0
+        self.document_calls = 0
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts):
+        self.document_calls += len(texts)
+        return self.embeddings.embed_documents(texts)
+
+
+def _legacy_seed_nodes(query_engine, query):
+    """
+    The original seeding: a retriever search, then one similarity_search_with_score per returned document.
+    """
+    retriever = query_engine.vector_store.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+    seeds = []
+    for doc in retriever.invoke(query):
+        closest_document, similarity_score = query_engine.vector_store.similarity_search_with_score(
+            doc.page_content, k=1)[0]
+        seeds.append((query_engine.knowledge_graph.node_for_document(closest_document), 1 / similarity_score))
+    return seeds
+
+
+def benchmark_seed_retrieval(graph_rag, queries, debug=False):
+    """
+    Measures embedding calls and latency per query for the legacy six-search seeding and the single
+    scored search used by QueryEngine._retrieve_seeds. Needs a built GraphRAG and a running Ollama.
+    """
+    query_engine = graph_rag.query_engine
+    original_embeddings = query_engine.vector_store._embedding_function
+    counting = CountingEmbeddings(original_embeddings)
+    query_engine.vector_store._embedding_function = counting
+    query_engine.embedding_model = counting
+    result = {"queries": len(queries)}
+    try:
+        for name, seed_fn in (("legacy", lambda q: _legacy_seed_nodes(query_engine, q)),
+                              ("single_search", query_engine._retrieve_seeds)):
+            counting.query_calls = counting.document_calls = 0
+            start = time.perf_counter()
+            for query in queries:
+                seed_fn(query)
+            result[f"{name}_ms_per_query"] = 1000 * (time.perf_counter() - start) / len(queries)
+            result[f"{name}_embeddings_per_query"] = (counting.query_calls + counting.document_calls) / len(queries)
+    finally:
+        query_engine.vector_store._embedding_function = original_embeddings
+        query_engine.embedding_model = original_embeddings
+    if debug:
+        print(result)
+    return result
+
+
+def benchmark_pagerank(num_nodes=100_000, queries=50, max_nodes=30, debug=False):
+    """
+    Times personalized PageRank from 5 random seeds against the compact Dijkstra-like walk over
+    max_nodes nodes, leaving out LLM calls; the transition matrix is built once and reused.
+    """
+    knowledge_graph = make_random_graph(num_nodes)
+    compact = CompactGraph.from_networkx(knowledge_graph.graph)
+    rng = np.random.default_rng(0)
+    seeds = rng.integers(0, num_nodes, size=(queries, 5)).tolist()
+
+    start = time.perf_counter()
+    knowledge_graph.transition_matrix()
+    result = {"nodes": num_nodes, "transition_matrix_build_s": time.perf_counter() - start}
+    start = time.perf_counter()
+    for query_seeds in seeds:
+        _traverse(compact, query_seeds, max_nodes)
+    result["traversal_ms_per_query"] = 1000 * (time.perf_counter() - start) / queries
+    iterations = 0
+    start = time.perf_counter()
+    for query_seeds in seeds:
+        iterations += knowledge_graph.personalized_pagerank(dict.fromkeys(query_seeds, 1.0))[1]
+    result["pagerank_ms_per_query"] = 1000 * (time.perf_counter() - start) / queries
+    result["pagerank_iterations"] = iterations / queries
+    if debug:
+        print(result)
+    return result
+
+
+def benchmark_retrieval_modes(graph_rag, queries, debug=False):
+    """
+    End-to-end latency and LLM calls per query for the traversal and pagerank retrieval modes,
+    bypassing the answer cache. Needs a built GraphRAG and a running Ollama.
+    """
+    query_engine = graph_rag.query_engine
+    original_mode = query_engine.retrieval_mode
+    result = {"queries": len(queries)}
+    try:
+        for mode in QueryEngine.RETRIEVAL_MODES:
+            query_engine.retrieval_mode = mode
+            llm_calls = 0
+            start = time.perf_counter()
+            for query in queries:
+                query_engine.query(query)
+                # One answer call unless a check already found the answer
+                llm_calls += query_engine.last_traversal_stats["llm_checks"] + 1
+            result[f"{mode}_s_per_query"] = (time.perf_counter() - start) / len(queries)
+            result[f"{mode}_llm_calls_per_query"] = llm_calls / len(queries)
+    finally:
+        query_engine.retrieval_mode = original_mode
+    if debug:
+        print(result)
+    return result
+
+
+def _figure_bytes(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.tell()
+
+
+def benchmark_renderers(edge_counts=(10_000, 100_000), legacy_max_edges=10_000, debug=False):
+    """
+    Compares render time and output size of the matplotlib nx.draw path with the vis-network JSON payload
+    and the edge density image, for random graphs with about edge_counts edges. Positions are random, as
+    the layout is cached per graph version and not part of rendering. The matplotlib path is only timed
+    up to legacy_max_edges edges.
+    """
+    results = []
+    for num_edges in edge_counts:
+        # make_random_graph draws about 5 edges per node
+        knowledge_graph = make_random_graph(num_edges // 5, dim=8)
+        graph = knowledge_graph.graph
+        positions = np.random.default_rng(0).uniform(-1, 1, size=(graph.number_of_nodes(), 2)).astype(np.float32)
+        result = {"nodes": graph.number_of_nodes(), "edges": graph.number_of_edges()}
+
+        if num_edges <= legacy_max_edges:
+            start = time.perf_counter()
+            fig, _ = Visualizer.visualize_graph(graph, pos=positions)
+            result["matplotlib_png_bytes"] = _figure_bytes(fig)
+            result["matplotlib_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        payload = json.dumps(Visualizer.graph_payload(graph, positions), separators=(",", ":"))
+        result["vis_network_s"] = time.perf_counter() - start
+        # The inlined vis-network script adds a fixed size on top (and is optional), so only the payload is counted
+        result["vis_network_payload_bytes"] = len(payload.encode("utf-8"))
+
+        start = time.perf_counter()
+        fig, _ = Visualizer.visualize_density(graph, positions)
+        result["density_png_bytes"] = _figure_bytes(fig)
+        result["density_s"] = time.perf_counter() - start
+        results.append(result)
+        if debug:
+            print(result)
+    return results
+
+
+async def _run_concurrent(query_engine, queries, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(query):
+        async with semaphore:
+            start = time.perf_counter()
+            await query_engine.aquery(query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(query) for query in queries))
+    return time.perf_counter() - start, latencies
+
+
+def benchmark_concurrent_queries(graph_rag, queries, concurrency_levels=(1, 8, 32), debug=False):
+    """
+    Load test for QueryEngine.aquery: runs all queries with at most `concurrency` in flight and reports
+    throughput and latency percentiles per level. The semantic answer cache is bypassed so every query
+    does its full traversal. Needs a built GraphRAG and a running Ollama.
+    """
+    results = []
+    for concurrency in concurrency_levels:
+        elapsed, latencies = asyncio.run(_run_concurrent(graph_rag.query_engine, queries, concurrency))
+        result = {"concurrency": concurrency, "queries": len(queries), "queries_per_second": len(queries) / elapsed,
+                  "p50_latency_s": float(np.percentile(latencies, 50)),
+                  "p95_latency_s": float(np.percentile(latencies, 95))}
+        results.append(result)
+        if debug:
+            print(result)
+    return results
+
+
+def main(debug=False):
+    benchmark_add_edges(debug=debug)
+    benchmark_knn_recall(debug=debug)
+    benchmark_snapshot_load(debug=debug)
+    benchmark_compact_graph(debug=debug)
+    benchmark_pagerank(debug=debug)
+    benchmark_renderers(debug=debug)
+
+
+if __name__ == "__main__":
+    main(debug=True)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import threading
+import numpy as np
+import networkx as nx
+from langchain_core.prompts import PromptTemplate
+from langchain.schema import AIMessage
+
+from llm_scheduler import LLMScheduler, run_sync
+
+logger = logging.getLogger(__name__)
+
+
+class CommunitySummaries:
+    METHODS = ("louvain", "label_propagation")
+    # Bump SUMMARY_PROMPT_VERSION whenever the summary prompt changes, so cached summaries are regenerated.
+    SUMMARY_PROMPT_VERSION = 1
+    SUMMARY_TEMPLATE = ("The following passages come from one topic cluster of a document. Summarize the main "
+                        "topics, entities and claims they share in one paragraph.\n\n{text}\n\nSummary:")
+
+    def __init__(self, knowledge_graph, cache=None, method="louvain", min_size=2, max_chunks=8, max_chars=6000,
+                 seed=0):
+        """
+        Detects communities in the knowledge graph and writes one LLM summary per community, so broad
+        questions can be answered from a handful of summaries instead of a long traversal. Each summary is
+        written from the max_chunks most central chunks of its community, cut to max_chars characters.
+        Summaries are stored in `cache` (an LLMCache) under the text they were written from, so rebuilding
+        after the graph changes only calls the LLM for communities whose chunks changed.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"method must be one of {self.METHODS}, got {method!r}")
+        self.knowledge_graph = knowledge_graph
+        self.cache = cache
+        self.method = method
+        self.min_size = min_size
+        self.max_chunks = max_chunks
+        self.max_chars = max_chars
+        self.seed = seed
+        self.scheduler = LLMScheduler(max_in_flight=4, queue_size=64, desc="Summarizing communities")
+        self.communities = []
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.version = None
+        self._pending_build = None
+        self._build_lock = threading.Lock()
+
+    def is_current(self):
+        return self.version == self.knowledge_graph.version
+
+    def detect(self):
+        """
+        Returns the graph's communities as sorted node lists, largest first. Nodes of communities smaller
+        than min_size (isolated chunks, mostly) are pooled in document order into catch-all groups of up to
+        max_chunks nodes, placed last, so every chunk is covered by some summary.
+        """
+        graph = self.knowledge_graph.graph
+        if self.method == "louvain":
+            communities = nx.community.louvain_communities(graph, weight="weight", seed=self.seed)
+        else:
+            communities = nx.community.asyn_lpa_communities(graph, weight="weight", seed=self.seed)
+        communities = [sorted(community) for community in communities]
+        leftover = sorted(node for community in communities if len(community) < self.min_size for node in community)
+        communities = sorted((community for community in communities if len(community) >= self.min_size),
+                             key=len, reverse=True)
+        return communities + [leftover[start:start + self.max_chunks]
+                              for start in range(0, len(leftover), self.max_chunks)]
+
+    def _summary_input(self, nodes, strength):
+        """
+        Picks the hub (most strongly connected node) of a community and the text its summary is written from.
+        """
+        central = sorted(nodes, key=lambda node: strength[node], reverse=True)[:self.max_chunks]
+        text = "\n\n".join(self.knowledge_graph.graph.nodes[node]['content'] for node in central)
+        return central[0], text[:self.max_chars]
+
+    async def _asummarize(self, text, llm):
+        summary_prompt = PromptTemplate(input_variables=["text"], template=self.SUMMARY_TEMPLATE)
+        response = await (summary_prompt | llm).ainvoke({"text": text})
+        if isinstance(response, AIMessage):
+            response = response.content
+        return response.strip()
+
+    def build(self, llm):
+        """
+        Detects the communities of the current graph version and summarizes each one, reusing cached
+        summaries. Returns the list of communities as dicts with id, nodes, hub and summary.
+        Call abuild() instead from inside an event loop. Threads that call this at the same time wait
+        for one build instead of each summarizing the graph.
+        """
+        with self._build_lock:
+            if not self.is_current():
+                run_sync(self.abuild(llm))
+            return self.communities
+
+    async def abuild(self, llm):
+        """
+        Async version of build() that never blocks the event loop: community detection runs in the
+        default executor and the summaries are awaited. Concurrent calls on one loop share a single build.
+        """
+        loop = asyncio.get_running_loop()
+        version = self.knowledge_graph.version
+        pending = self._pending_build
+        if pending is None or pending[0] != version or pending[1].get_loop() is not loop:
+            pending = self._pending_build = (version, loop.create_task(self._abuild(llm)))
+        try:
+            return await asyncio.shield(pending[1])
+        finally:
+            if pending[1].done() and self._pending_build is pending:
+                self._pending_build = None
+
+    async def _abuild(self, llm):
+        communities = await asyncio.get_running_loop().run_in_executor(None, self.detect)
+        strength = dict(self.knowledge_graph.graph.degree(weight="weight"))
+        inputs = [self._summary_input(nodes, strength) for nodes in communities]
+
+        model_name = getattr(llm, "model", type(llm).__name__)
+        prompt_version = f"community-summary-{self.SUMMARY_PROMPT_VERSION}"
+        summaries, on_result = {}, None
+        if self.cache is not None:
+            cache_keys = [self.cache.make_key(text, model_name, prompt_version) for _, text in inputs]
+            summaries = {i: self.cache.get(cache_key) for i, cache_key in enumerate(cache_keys)}
+            on_result = lambda i, summary: self.cache.set(cache_keys[i], summary)
+        misses = [(i, text) for i, (_, text) in enumerate(inputs) if summaries.get(i) is None]
+        summaries.update(await self.scheduler.run(
+            misses, lambda text: self._asummarize(text, llm), total=len(misses), on_result=on_result))
+
+        self.communities = [{"id": i, "nodes": nodes, "hub": inputs[i][0], "summary": summaries[i]}
+                            for i, nodes in enumerate(communities)]
+        embeddings = self.knowledge_graph.embeddings
+        centroids = np.zeros((len(communities), embeddings.shape[1]), dtype=np.float32)
+        for i, nodes in enumerate(communities):
+            centroids[i] = np.asarray(embeddings[nodes], dtype=np.float32).mean(axis=0)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms == 0, 1.0, norms)
+        self.version = self.knowledge_graph.version
+        logger.debug("Summarized %d communities (%d LLM calls)", len(self.communities), len(misses))
+        return self.communities
+
+    def rank(self, query_embedding):
+        """
+        Returns the community indices ordered by the cosine similarity of their embedding centroid to
+        the query, and the similarities themselves.
+        """
+        if not self.communities:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        similarities = self.centroids @ (query_vector / (np.linalg.norm(query_vector) or 1.0))
+        return np.argsort(-similarities, kind="stable"), similarities
@@ -0,0 +1,70 @@
+from graph_snapshot import StringTable, edge_csr
+
+
+class CompactGraph:
+    def __init__(self, indptr, indices, weights, contents):
+        """
+        Array-backed, read-only graph for the traversal hot path: CSR adjacency with int32 neighbour
+        ids and float32 weights, and node contents as offsets into one contiguous UTF-8 buffer.
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.contents = contents
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Wraps the memory-mapped arrays of a GraphSnapshot without copying them.
+        """
+        return cls(snapshot.edge_indptr, snapshot.edge_indices, snapshot.edge_weights, snapshot.contents)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """
+        Packs an nx.Graph whose nodes are numbered 0..N-1 into the compact layout.
+        """
+        num_nodes = graph.number_of_nodes()
+        indptr, indices, attributes = edge_csr(graph, num_nodes)
+        contents = StringTable.from_strings(graph.nodes[node]['content'] for node in range(num_nodes))
+        return cls(indptr, indices, attributes['weight'], contents)
+
+    def number_of_nodes(self):
+        return len(self.indptr) - 1
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def weighted_neighbors(self, node):
+        """
+        Returns (neighbor, weight) pairs for a node as plain Python values.
+        """
+        start, stop = self.indptr[node], self.indptr[node + 1]
+        return zip(self.indices[start:stop].tolist(), self.weights[start:stop].tolist())
+
+    def content(self, node):
+        return self.contents[node]
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes + self.contents.nbytes
+
+
+class NetworkXGraphView:
+    def __init__(self, graph):
+        """
+        Exposes an nx.Graph through the same neighbour and content operations as CompactGraph.
+        """
+        self.graph = graph
+
+    def number_of_nodes(self):
+        return self.graph.number_of_nodes()
+
+    def neighbors(self, node):
+        return list(self.graph.neighbors(node))
+
+    def weighted_neighbors(self, node):
+        return ((neighbor, data['weight']) for neighbor, data in self.graph[node].items())
+
+    def content(self, node):
+        return self.graph.nodes[node]['content']
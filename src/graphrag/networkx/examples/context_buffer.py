@@ -0,0 +1,77 @@
+import math
+
+# English text averages about 4 characters per token with Llama 3's 128k-token vocabulary
+CHARS_PER_TOKEN = 4.0
+
+
+def estimate_tokens(text, chars_per_token=CHARS_PER_TOKEN):
+    """
+    Approximate token count from the text length. Needs no tokenizer, so it works offline; pass a
+    real tokenizer to ContextBuffer when exact budgets matter.
+    """
+    return math.ceil(len(text) / chars_per_token)
+
+
+class ContextBuffer:
+    EVICTION_STRATEGIES = ("lowest_weight", "oldest")
+
+    def __init__(self, count_tokens, max_tokens=4000, eviction="lowest_weight", separator="\n"):
+        """
+        Accumulates context chunks under a token budget. Each chunk is tokenized once with count_tokens
+        when it is added, chunks are kept as a list and joined only when the text is read, and chunks are
+        evicted (lowest weight first, or oldest first) whenever the budget would be exceeded.
+        """
+        if eviction not in self.EVICTION_STRATEGIES:
+            raise ValueError(f"eviction must be one of {self.EVICTION_STRATEGIES}, got {eviction!r}")
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.eviction = eviction
+        self.separator = separator
+        self.separator_tokens = count_tokens(separator) if separator else 0
+        self.chunks = []
+        self.total_tokens = 0
+        self.evicted = []
+        self._order = 0
+        self._text = None
+
+    def add(self, key, text, weight=1.0):
+        """
+        Adds a chunk and returns its token count. Chunks that alone exceed the budget are not kept.
+        """
+        tokens = self.count_tokens(text)
+        if tokens > self.max_tokens:
+            self.evicted.append(key)
+            return tokens
+        self.chunks.append({"key": key, "text": text, "tokens": tokens, "weight": weight, "order": self._order})
+        self._order += 1
+        self.total_tokens += tokens + (self.separator_tokens if len(self.chunks) > 1 else 0)
+        self._text = None
+        while self.total_tokens > self.max_tokens:
+            self._evict()
+        return tokens
+
+    def _evict(self):
+        if self.eviction == "oldest":
+            index = 0
+        else:
+            # Ties go to the oldest chunk
+            index = min(range(len(self.chunks)), key=lambda i: (self.chunks[i]["weight"], self.chunks[i]["order"]))
+        chunk = self.chunks.pop(index)
+        self.total_tokens -= chunk["tokens"] + (self.separator_tokens if self.chunks else 0)
+        self.evicted.append(chunk["key"])
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.separator.join(chunk["text"] for chunk in self.chunks)
+        return self._text
+
+    @property
+    def keys(self):
+        return [chunk["key"] for chunk in self.chunks]
+
+    def __contains__(self, key):
+        return any(chunk["key"] == key for chunk in self.chunks)
+
+    def __len__(self):
+        return len(self.chunks)
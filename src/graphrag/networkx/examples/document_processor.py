@@ -1,5 +1,6 @@
-
+import uuid
 import nltk
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaEmbeddings  # Updated import
 from langchain_community.vectorstores import Chroma  # Updated import
@@ -9,18 +10,66 @@ nltk.download('punkt', quiet=True)
 nltk.download('wordnet', quiet=True)
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, persist_directory="../../../data/graph_chroma_dbs"):
         """
         Initializes the DocumentProcessor with a text splitter and embeddings.
         """
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
         self.embeddings = OllamaEmbeddings(model="llama3.2")
+        self.persist_directory = persist_directory
+        self.vector_store_batch_size = 4096
 
     def process_documents(self, documents):
-        splits = self.text_splitter.split_documents(documents)
-        vector_store = Chroma.from_documents(
-            splits,
-            self.embeddings,
-            persist_directory="../../../data/graph_chroma_dbs"
-        )
-        return splits, vector_store
+        """
+        Splits the documents and embeds every split exactly once. The returned float32 embeddings
+        are the same vectors stored in the vector store, so they can be reused by the graph builder.
+        Split i is stored with node_id i, matching the node the knowledge graph builds for it.
+        """
+        splits, embeddings = self.split_and_embed(documents)
+        vector_store = self.create_vector_store(splits, embeddings)
+        return splits, embeddings, vector_store
+
+    def split_and_embed(self, documents):
+        """
+        Splits the documents and embeds the resulting splits, without touching the vector store.
+        documents may be a generator (e.g. PDFExtractor.iter_pages); each document is split as it arrives,
+        so the whole page list is never held in memory.
+        """
+        splits = [split for document in documents for split in self.text_splitter.split_documents([document])]
+        return splits, self.embed_splits(splits)
+
+    def embed_splits(self, splits):
+        """
+        Embeds the document splits into a float32 array of shape (len(splits), dim).
+        """
+        texts = [split.page_content for split in splits]
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+    def create_vector_store(self, splits, embeddings):
+        """
+        Creates the Chroma vector store from precomputed embeddings instead of re-embedding the splits.
+        """
+        vector_store = self.open_vector_store()
+        self.add_to_vector_store(vector_store, splits, embeddings)
+        return vector_store
+
+    def open_vector_store(self):
+        """
+        Opens the Chroma vector store in persist_directory, e.g. one written by an earlier create_vector_store.
+        """
+        return Chroma(embedding_function=self.embeddings, persist_directory=self.persist_directory)
+
+    def add_to_vector_store(self, vector_store, splits, embeddings, first_node_id=0):
+        """
+        Writes splits and their precomputed embeddings to the vector store in Chroma-sized batches.
+        Each split's metadata gets the knowledge-graph node id it will have (first_node_id + i), so a
+        search hit can be mapped back to its node directly.
+        """
+        for start in range(0, len(splits), self.vector_store_batch_size):
+            batch = splits[start:start + self.vector_store_batch_size]
+            vector_store._collection.upsert(
+                ids=[str(uuid.uuid4()) for _ in batch],
+                embeddings=embeddings[start:start + len(batch)].tolist(),
+                documents=[split.page_content for split in batch],
+                metadatas=[{**split.metadata, "node_id": first_node_id + start + i} for i, split in enumerate(batch)],
+            )
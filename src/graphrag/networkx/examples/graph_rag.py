@@ -3,31 +3,147 @@ from document_processor import DocumentProcessor
 from knowledge_graph import KnowledgeGraph
 from query_engine import QueryEngine
 from visualizer import Visualizer
-from langchain_ollama import ChatOllama, OllamaEmbeddings
+from answer_cache import SemanticAnswerCache
+from query_events import AnswerToken, QueryCompleted
+from ingestion_pipeline import IngestionPipeline
+from langchain_ollama import ChatOllama
 
 class GraphRAG:
-    def __init__(self, documents):
+    def __init__(self, documents=None, community_summaries=False, persist_directory="../../../data/graph_chroma_dbs"):
         """
-        Initializes the GraphRAG system.
+        Initializes the GraphRAG system. With community_summaries=True the community summaries used by the
+        "global" retrieval mode are written at build time instead of on the first global query.
+        Without documents nothing is built, as when the pipeline is opened with load().
         """
         self.llm = ChatOllama(model="llama3.2", temperature=0)
-        self.embedding_model = OllamaEmbeddings(model="llama3.2")
-        self.document_processor = DocumentProcessor()  # Use the DocumentProcessor
+        self.document_processor = DocumentProcessor(persist_directory)  # Use the DocumentProcessor
+        self.embedding_model = self.document_processor.embeddings
         self.knowledge_graph = KnowledgeGraph()
+        self.vector_store = None
         self.query_engine = None
         self.visualizer = Visualizer()
-        self.process_documents(documents)
+        # Answers to the same or paraphrased questions are reused until the graph changes
+        self.answer_cache = SemanticAnswerCache()
+        if documents is not None:
+            self.process_documents(documents)
+            if community_summaries:
+                self.build_community_summaries()
+
+    def save(self, path):
+        """
+        Saves the knowledge graph as a snapshot directory. The vector store is already persisted in its
+        persist_directory, so the two together are everything load() needs.
+        """
+        return self.knowledge_graph.save(path)
+
+    @classmethod
+    def load(cls, path, persist_directory, backend="compact"):
+        """
+        Opens a GraphRAG from a snapshot written by save() and the Chroma directory it was built with,
+        without splitting, embedding or calling the LLM. The default compact backend queries the
+        memory-mapped snapshot directly, so the nx.Graph is never materialized unless it is needed.
+        """
+        graph_rag = cls(persist_directory=persist_directory)
+        graph_rag.knowledge_graph = KnowledgeGraph.load(path, backend=backend)
+        graph_rag.vector_store = graph_rag.document_processor.open_vector_store()
+        graph_rag.query_engine = QueryEngine(graph_rag.vector_store, graph_rag.knowledge_graph,
+                                             graph_rag.embedding_model)
+        return graph_rag
 
     def process_documents(self, documents):
-        splits, vector_store = self.document_processor.process_documents(documents)
-        self.knowledge_graph.build_graph(splits, self.llm, self.embedding_model)
-        self.query_engine = QueryEngine(vector_store, self.knowledge_graph)
+        """
+        Splits and embeds the documents once, then feeds the same vectors to the graph builder.
+        """
+        splits, embeddings, self.vector_store = self.document_processor.process_documents(documents)
+        self.knowledge_graph.build_graph(splits, self.llm, self.embedding_model, embeddings=embeddings)
+        self.query_engine = QueryEngine(self.vector_store, self.knowledge_graph, self.embedding_model)
+
+    def add_documents(self, documents):
+        """
+        Adds documents to an already processed GraphRAG without rebuilding it. Only the new splits
+        are embedded, written to the vector store and linked into the knowledge graph.
+        """
+        splits, embeddings = self.document_processor.split_and_embed(documents)
+        return self.add_splits(splits, embeddings)
+
+    def add_splits(self, splits, embeddings):
+        """
+        Adds already split and embedded chunks: writes them to the vector store and links them into the
+        knowledge graph. Opens the vector store and query engine first if nothing has been added yet.
+        Returns the new node ids.
+        """
+        if self.vector_store is None:
+            self.vector_store = self.document_processor.open_vector_store()
+        self.document_processor.add_to_vector_store(self.vector_store, splits, embeddings,
+                                                    first_node_id=self.knowledge_graph.graph.number_of_nodes())
+        new_nodes = self.knowledge_graph.add_documents(splits, self.llm, self.embedding_model, embeddings=embeddings)
+        if self.query_engine is None:
+            self.query_engine = QueryEngine(self.vector_store, self.knowledge_graph, self.embedding_model)
+        return new_nodes
 
+    def ingest(self, documents, batch_size=512):
+        """
+        Adds documents through the streaming IngestionPipeline, yielding a stats dict after each batch.
+        The nodes of every finished batch can be queried before the remaining documents are processed.
+        See IngestionPipeline for the choice of batch_size.
+        """
+        yield from IngestionPipeline(self, batch_size=batch_size).run(documents)
+
+    def build_community_summaries(self):
+        """
+        Detects communities in the knowledge graph and writes (or loads from the LLM cache) one summary per
+        community for global queries.
+        """
+        return self.query_engine.community_summaries.build(self.llm)
+
+    def _cache_version(self):
+        """
+        Cached answers are only valid for the graph version and retrieval mode they were produced with.
+        """
+        return self.knowledge_graph.version, self.query_engine.retrieval_mode
 
     def query(self, query: str):
         """
-        Handles a query using the query engine.
+        Handles a query using the query engine, answering from the semantic cache when a similar
+        question was already asked against the current graph version.
         """
-        response, traversal_path, filtered_content = self.query_engine.query(query)
+        query_embedding = self.embedding_model.embed_query(query)
+        cached = self.answer_cache.get(query_embedding, self._cache_version())
+        if cached is not None:
+            return cached
+        response, traversal_path, filtered_content = self.query_engine.query(query, query_embedding)
+        self.answer_cache.set(query_embedding, self._cache_version(),
+                              (response, traversal_path, filtered_content))
         return response, traversal_path, filtered_content
 
+    def stream_query(self, query: str):
+        """
+        Handles a query using the query engine, yielding traversal and answer-token events as they happen.
+        A cache hit is replayed as a single AnswerToken followed by QueryCompleted.
+        """
+        query_embedding = self.embedding_model.embed_query(query)
+        version = self._cache_version()
+        cached = self.answer_cache.get(query_embedding, version)
+        if cached is not None:
+            response, traversal_path, filtered_content = cached
+            yield AnswerToken(response)
+            yield QueryCompleted(response, traversal_path, filtered_content, {"cache_hit": True})
+            return
+        for event in self.query_engine.stream_query(query, query_embedding):
+            if isinstance(event, QueryCompleted):
+                self.answer_cache.set(query_embedding, version,
+                                      (event.answer, event.traversal_path, event.filtered_content))
+            yield event
+
+    async def aquery(self, query: str):
+        """
+        Async version of query(). Several aquery calls can run concurrently on one GraphRAG.
+        """
+        query_embedding = await self.embedding_model.aembed_query(query)
+        version = self._cache_version()
+        cached = self.answer_cache.get(query_embedding, version)
+        if cached is not None:
+            return cached
+        response, traversal_path, filtered_content = await self.query_engine.aquery(query, query_embedding)
+        self.answer_cache.set(query_embedding, version, (response, traversal_path, filtered_content))
+        return response, traversal_path, filtered_content
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+import networkx as nx
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+class StringTable:
+    def __init__(self, buffer, offsets):
+        """
+        Read-only table of UTF-8 strings stored as one contiguous byte buffer plus int64 offsets,
+        so entry i is buffer[offsets[i]:offsets[i + 1]]. Strings are decoded only when accessed.
+        """
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def save(self, directory, name):
+        with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+            f.write(self.buffer.tobytes())
+        np.save(os.path.join(directory, f"{name}_offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, directory, name):
+        offsets = np.load(os.path.join(directory, f"{name}_offsets.npy"), mmap_mode="r")
+        if offsets[-1] == 0:
+            # np.memmap refuses to map an empty file
+            return cls(np.empty(0, dtype=np.uint8), offsets)
+        return cls(np.memmap(os.path.join(directory, f"{name}.bin"), dtype=np.uint8, mode="r"), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes
+
+
+class GraphSnapshot:
+    def __init__(self, path):
+        """
+        Opens a snapshot directory. Array files are memory-mapped, so opening costs O(1) in the
+        graph size and pages are only read when they are touched.
+        """
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if self.manifest["format_version"] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {self.manifest['format_version']} in {path}")
+
+        def array(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.embeddings = array("embeddings")
+        self.edge_indptr = array("edge_indptr")
+        self.edge_indices = array("edge_indices")
+        self.edge_weights = array("edge_weights")
+        self.edge_similarities = array("edge_similarities")
+        self.edge_shared_counts = array("edge_shared_counts")
+        self.contents = StringTable.load(path, "contents")
+        self.concept_strings = StringTable.load(path, "concept_strings")
+        self.node_concept_indptr = array("node_concept_indptr")
+        self.node_concept_ids = array("node_concept_ids")
+        self.concept_names = StringTable.load(path, "concept_names")
+        self.concept_matrix_indptr = array("concept_matrix_indptr")
+        self.concept_matrix_indices = array("concept_matrix_indices")
+        # Layout positions are optional, snapshots written without them still open
+        positions_path = os.path.join(path, "positions.npy")
+        self.positions = np.load(positions_path, mmap_mode="r") if os.path.exists(positions_path) else None
+
+    @property
+    def num_nodes(self):
+        return self.manifest["num_nodes"]
+
+    def node_concepts(self, node):
+        """
+        Returns the raw (unlemmatized) concepts of a node.
+        """
+        ids = self.node_concept_ids[self.node_concept_indptr[node]:self.node_concept_indptr[node + 1]]
+        return [self.concept_strings[concept_id] for concept_id in ids]
+
+    def to_networkx(self):
+        """
+        Materializes the snapshot as an nx.Graph with the same node and edge attributes as a built graph.
+        """
+        graph = nx.Graph()
+        graph.add_nodes_from((node, {'content': self.contents[node], 'concepts': self.node_concepts(node)})
+                             for node in range(self.num_nodes))
+        rows = np.repeat(np.arange(self.num_nodes), np.diff(self.edge_indptr))
+        # The CSR stores both directions; keep each undirected edge once
+        upper = rows < self.edge_indices
+        graph.add_edges_from(
+            (node1, node2, {'weight': weight, 'similarity': similarity, 'shared_concept_count': shared})
+            for node1, node2, weight, similarity, shared in zip(
+                rows[upper].tolist(), self.edge_indices[upper].tolist(), self.edge_weights[upper].tolist(),
+                self.edge_similarities[upper].tolist(), self.edge_shared_counts[upper].tolist())
+        )
+        return graph
+
+
+def edge_csr(graph, num_nodes):
+    """
+    Converts the graph's edges into a symmetric CSR adjacency with per-entry weight, similarity
+    and shared-concept-count arrays.
+    """
+    from scipy import sparse
+
+    edges = list(graph.edges(data=True))
+    rows = np.fromiter((u for u, _, _ in edges), dtype=np.int64, count=len(edges))
+    cols = np.fromiter((v for _, v, _ in edges), dtype=np.int64, count=len(edges))
+    attributes = {
+        'weight': np.fromiter((d['weight'] for _, _, d in edges), dtype=np.float32, count=len(edges)),
+        'similarity': np.fromiter((d['similarity'] for _, _, d in edges), dtype=np.float32, count=len(edges)),
+        'shared_concept_count': np.fromiter((d.get('shared_concept_count', 0) for _, _, d in edges),
+                                            dtype=np.int32, count=len(edges)),
+    }
+    # Each CSR entry carries the index of its source edge, so attributes can be gathered in CSR order
+    edge_ids = np.arange(len(edges), dtype=np.int64)
+    adjacency = sparse.csr_matrix(
+        (np.concatenate([edge_ids, edge_ids]) + 1, (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+        shape=(num_nodes, num_nodes),
+    )
+    adjacency.sort_indices()
+    order = adjacency.data - 1
+    return (adjacency.indptr.astype(np.int64), adjacency.indices.astype(np.int32),
+            {name: values[order] for name, values in attributes.items()})
+
+
+def save_snapshot(knowledge_graph, path):
+    """
+    Writes the knowledge graph to a snapshot directory:
+    - embeddings.npy: float32 embeddings, memory-mappable
+    - edge_*.npy: symmetric CSR adjacency with weight, similarity and shared-concept-count arrays
+    - contents / concept_strings / concept_names: string tables for chunk text, raw and lemmatized concepts
+    - positions.npy: (N, 2) float32 layout positions for drawing, when the layout has been computed
+    - manifest.json: models, threshold and similarity settings used to build the graph
+    The snapshot is written next to path and swapped in at the end, so an existing snapshot that
+    is memory-mapped by a running process is never truncated under it.
+    """
+    graph = knowledge_graph.graph
+    num_nodes = graph.number_of_nodes()
+    tmp_path = f"{path.rstrip(os.sep)}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "embeddings.npy"), np.asarray(knowledge_graph.embeddings, dtype=np.float32))
+    edge_indptr, edge_indices, edge_attributes = edge_csr(graph, num_nodes)
+    np.save(os.path.join(tmp_path, "edge_indptr.npy"), edge_indptr)
+    np.save(os.path.join(tmp_path, "edge_indices.npy"), edge_indices)
+    np.save(os.path.join(tmp_path, "edge_weights.npy"), edge_attributes['weight'])
+    np.save(os.path.join(tmp_path, "edge_similarities.npy"), edge_attributes['similarity'])
+    np.save(os.path.join(tmp_path, "edge_shared_counts.npy"), edge_attributes['shared_concept_count'])
+
+    StringTable.from_strings(graph.nodes[node]['content'] for node in range(num_nodes)).save(tmp_path, "contents")
+
+    # Raw concepts repeat a lot across chunks, so each distinct string is stored once
+    concept_string_ids = {}
+    node_concept_indptr, node_concept_ids = [0], []
+    for node in range(num_nodes):
+        for concept in graph.nodes[node].get('concepts', []):
+            node_concept_ids.append(concept_string_ids.setdefault(concept, len(concept_string_ids)))
+        node_concept_indptr.append(len(node_concept_ids))
+    StringTable.from_strings(concept_string_ids).save(tmp_path, "concept_strings")
+    np.save(os.path.join(tmp_path, "node_concept_indptr.npy"), np.asarray(node_concept_indptr, dtype=np.int64))
+    np.save(os.path.join(tmp_path, "node_concept_ids.npy"), np.asarray(node_concept_ids, dtype=np.int32))
+
+    StringTable.from_strings(knowledge_graph.concept_names).save(tmp_path, "concept_names")
+    np.save(os.path.join(tmp_path, "concept_matrix_indptr.npy"),
+            np.asarray(knowledge_graph.concept_matrix.indptr, dtype=np.int64))
+    np.save(os.path.join(tmp_path, "concept_matrix_indices.npy"),
+            np.asarray(knowledge_graph.concept_matrix.indices, dtype=np.int32))
+
+    # Only a layout already computed for this graph version is saved; saving never runs the layout itself
+    positions = knowledge_graph.layout(compute=False)
+    if positions is not None:
+        np.save(os.path.join(tmp_path, "positions.npy"), np.asarray(positions, dtype=np.float32))
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": time.time(),
+        "num_nodes": num_nodes,
+        "num_edges": graph.number_of_edges(),
+        "embedding_dim": int(knowledge_graph.embeddings.shape[1]) if knowledge_graph.embeddings.size else 0,
+        "embedding_model": knowledge_graph.embedding_model_name,
+        "llm_model": knowledge_graph.llm_model_name,
+        "concept_prompt_version": knowledge_graph.CONCEPT_PROMPT_VERSION,
+        "edges_threshold": knowledge_graph.edges_threshold,
+        "similarity_mode": knowledge_graph.similarity_mode,
+        "knn_k": knowledge_graph.knn_k,
+        "graph_version": knowledge_graph.version,
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return manifest
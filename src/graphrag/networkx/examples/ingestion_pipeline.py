@@ -0,0 +1,126 @@
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+class IngestionPipeline:
+    def __init__(self, graph_rag, batch_size=512, queue_size=2):
+        """
+        Streams documents into a GraphRAG through three stages connected by bounded queues: a splitting
+        thread cuts incoming documents into batches of batch_size splits, an embedding thread embeds each
+        batch, and the calling thread adds every embedded batch with GraphRAG.add_splits (vector store,
+        concept extraction and edges). Embedding the next batch overlaps with the LLM concept extraction of
+        the current one, at most queue_size batches wait between two stages, and the nodes of each
+        finished batch are queryable right away.
+        Batches should stay large: spaCy NER only uses several processes for at least
+        4 * KnowledgeGraph.ner_batch_size texts (256 by default), and the LLM scheduler drains at every
+        batch boundary.
+        """
+        self.graph_rag = graph_rag
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.metrics = None
+
+    def run(self, documents):
+        """
+        Ingests documents, which may be a generator such as PDFExtractor.iter_pages, and yields a stats dict
+        after each batch is added to the graph. The GraphRAG can be queried between batches. Closing the
+        generator early stops the background stages.
+        """
+        split_queue = queue.Queue(maxsize=self.queue_size)
+        embedded_queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        processor = self.graph_rag.document_processor
+
+        def put(stage_queue, item):
+            # Time out regularly, so a stage blocked on a full queue notices when the consumer has gone away
+            while not stop.is_set():
+                try:
+                    stage_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(stage_queue):
+            while not stop.is_set():
+                try:
+                    return stage_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return _DONE
+
+        def split_stage():
+            try:
+                batch = []
+                for document in documents:
+                    batch.extend(processor.text_splitter.split_documents([document]))
+                    while len(batch) >= self.batch_size:
+                        if not put(split_queue, batch[:self.batch_size]):
+                            return
+                        batch = batch[self.batch_size:]
+                if batch and not put(split_queue, batch):
+                    return
+                put(split_queue, _DONE)
+            except Exception as error:
+                put(split_queue, _StageError(error))
+
+        def embed_stage():
+            try:
+                while True:
+                    batch = get(split_queue)
+                    if batch is _DONE or isinstance(batch, _StageError):
+                        put(embedded_queue, batch)
+                        return
+                    start = time.perf_counter()
+                    embeddings = processor.embed_splits(batch)
+                    if not put(embedded_queue, (batch, embeddings, time.perf_counter() - start)):
+                        return
+            except Exception as error:
+                put(embedded_queue, _StageError(error))
+
+        threads = [threading.Thread(target=split_stage, name="ingest-split", daemon=True),
+                   threading.Thread(target=embed_stage, name="ingest-embed", daemon=True)]
+        for thread in threads:
+            thread.start()
+
+        started_at = time.perf_counter()
+        metrics = self.metrics = {"batches": 0, "nodes": 0, "embedding_seconds": 0.0, "graph_seconds": 0.0}
+        try:
+            while True:
+                item = embedded_queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.error
+                splits, embeddings, embedding_seconds = item
+                start = time.perf_counter()
+                new_nodes = self.graph_rag.add_splits(splits, embeddings)
+                graph_seconds = time.perf_counter() - start
+
+                metrics["batches"] += 1
+                metrics["nodes"] += len(new_nodes)
+                metrics["embedding_seconds"] += embedding_seconds
+                metrics["graph_seconds"] += graph_seconds
+                yield {"batch": metrics["batches"], "nodes_added": len(new_nodes),
+                       "total_nodes": self.graph_rag.knowledge_graph.graph.number_of_nodes(),
+                       "embedding_seconds": embedding_seconds, "graph_seconds": graph_seconds,
+                       "elapsed_seconds": time.perf_counter() - started_at,
+                       "queued_split_batches": split_queue.qsize(), "queued_embedded_batches": embedded_queue.qsize()}
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        metrics["elapsed_seconds"] = time.perf_counter() - started_at
+        logger.debug("Ingestion: %s", metrics)
@@ -1,56 +1,353 @@
 
+import os
+import asyncio
+import logging
+import threading
+import hashlib
 import nltk
+import numpy as np
 import spacy
 import networkx as nx
+from scipy import sparse
 from pydantic import BaseModel, Field
 from typing import List, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from langchain_core.prompts import PromptTemplate
 from langchain_ollama import ChatOllama
 from langchain.schema import AIMessage
 
+from llm_cache import LLMCache
+from llm_scheduler import LLMScheduler, run_sync
+from graph_snapshot import GraphSnapshot, save_snapshot, edge_csr
+from compact_graph import CompactGraph, NetworkXGraphView
+
+logger = logging.getLogger(__name__)
+
 # Download necessary NLTK data
 nltk.download('punkt', quiet=True)
 nltk.download('wordnet', quiet=True)
 
 class KnowledgeGraph:
-    def __init__(self):
+    SIMILARITY_MODES = ("exact", "knn")
+    BACKENDS = ("networkx", "compact")
+    # Bump CONCEPT_PROMPT_VERSION whenever the extraction prompt or post-processing changes,
+    # so cached results from the old prompt are no longer served.
+    CONCEPT_PROMPT_VERSION = 2
+    CONCEPT_EXTRACTION_TEMPLATE = ("Extract key concepts (excluding named entities) from the following text:"
+                                   "\n\n{text}\n\nKey concepts:")
+    NER_PIPES = ("ner",)
+    NER_LABELS = ("PERSON", "ORG", "GPE", "WORK_OF_ART")
+
+    def __init__(self, similarity_mode="exact", knn_k=10,
+                 concept_cache_path="../../../data/graph_cache/llm_cache.sqlite", concept_cache_size=100_000,
+                 backend="networkx"):
         """
         Initializes the KnowledgeGraph with a graph, lemmatizer, and NLP model.
+
+        similarity_mode="exact" compares every pair of chunks; similarity_mode="knn" links each
+        chunk only to its knn_k approximate nearest neighbours, keeping memory at O(N * knn_k).
+        Extracted concepts are cached on disk at concept_cache_path and survive process restarts.
+        backend="compact" serves query traversal from an array-backed CompactGraph instead of the nx.Graph.
         """
-        self.graph = nx.Graph()
+        if similarity_mode not in self.SIMILARITY_MODES:
+            raise ValueError(f"similarity_mode must be one of {self.SIMILARITY_MODES}, got {similarity_mode!r}")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"backend must be one of {self.BACKENDS}, got {backend!r}")
+        self.backend = backend
+        self._graph = nx.Graph()
+        self.snapshot = None
         self.lemmatizer = nltk.WordNetLemmatizer()
-        self.concept_cache = {}
-        self.nlp = self._load_spacy_model()
+        self.concept_cache = LLMCache(concept_cache_path, max_entries=concept_cache_size)
+        self._nlp = None
+        self.ner_batch_size = 64
+        self.ner_processes = max(1, (os.cpu_count() or 2) - 1)
+        # A local Ollama serves OLLAMA_NUM_PARALLEL (4 by default) requests at once; more only queue server-side
+        self.extraction_scheduler = LLMScheduler(max_in_flight=4, queue_size=64,
+                                                 desc="Extracting concepts and entities")
+        self.extraction_metrics = None
         self.edges_threshold = 0.8
+        self.edge_block_size = 256
+        self.similarity_mode = similarity_mode
+        self.knn_k = knn_k
+        self.knn_hnsw_m = 32
+        self.knn_ef_search = max(2 * knn_k, 64)
+        self.concept_vocab = {}
+        self.concept_names = []
+        self.concept_matrix = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.embeddings = np.empty((0, 0), dtype=np.float32)
+        # Growable backing storage for embeddings and the concept index, so incremental adds copy only
+        # the new rows; capacities double when full
+        self._embedding_buffer = None
+        self._concept_indptr = None
+        self._concept_indices = None
+        self._concept_data = None
+        self._concept_nodes = None
+        self._concept_nodes_source = None
+        self.version = 0
+        self.embedding_model_name = None
+        self.llm_model_name = None
+        self._ann_index = None
+        self._compact_graph = None
+        self._compact_graph_version = None
+        self._content_index = None
+        self._content_index_version = None
+        self._transition_matrix = None
+        self._transition_dangling = None
+        self._transition_matrix_version = None
+        self._positions = None
+        self._positions_version = None
+        # Guards the lazily built per-version structures above when one graph serves several threads
+        self._lazy_lock = threading.RLock()
+
+    @property
+    def graph(self):
+        """
+        The nx.Graph view of the knowledge graph. A graph opened with load() is only materialized
+        from its snapshot the first time this is accessed.
+        """
+        with self._lazy_lock:
+            if self._graph is None:
+                self._graph = self.snapshot.to_networkx()
+            return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+
+    def graph_view(self):
+        """
+        Returns the graph the query engine traverses: a CompactGraph for the compact backend (taken
+        straight from the snapshot when the graph has not changed since load) or a view of the nx.Graph.
+        """
+        if self.backend == "networkx":
+            return NetworkXGraphView(self.graph)
+        with self._lazy_lock:
+            if self._compact_graph is None or self._compact_graph_version != self.version:
+                if self._graph is None:
+                    self._compact_graph = CompactGraph.from_snapshot(self.snapshot)
+                else:
+                    self._compact_graph = CompactGraph.from_networkx(self._graph)
+                self._compact_graph_version = self.version
+            return self._compact_graph
+
+    def node_for_document(self, document):
+        """
+        Maps a vector-store document back to its graph node. Documents written with a node_id in their
+        metadata resolve in O(1); the id is trusted only if the node's content matches, since a shared
+        persist directory can hold chunks of other graphs. Others fall back to the content-hash index.
+        Returns None if the document is not part of this graph.
+        """
+        graph = self.graph_view()
+        node_id = document.metadata.get("node_id")
+        if node_id is not None and 0 <= node_id < graph.number_of_nodes() \
+                and graph.content(node_id) == document.page_content:
+            return node_id
+        return self.node_for_content(document.page_content)
+
+    def node_for_content(self, content):
+        """
+        Looks a chunk up by the hash of its content. The index is built on first use per graph version.
+        """
+        with self._lazy_lock:
+            if self._content_index is None or self._content_index_version != self.version:
+                graph = self.graph_view()
+                self._content_index = {self._content_hash(graph.content(node)): node
+                                       for node in range(graph.number_of_nodes())}
+                self._content_index_version = self.version
+            return self._content_index.get(self._content_hash(content))
+
+    def layout(self, compute=True):
+        """
+        Returns the node positions used for drawing as an (N, 2) float32 array, computed once per graph
+        version instead of on every render. A graph opened with load() uses the positions saved in its
+        snapshot; after add_documents the previous positions seed the new layout, so the picture stays stable.
+        With compute=False, returns None instead of running the layout.
+        """
+        with self._lazy_lock:
+            if self._positions is None or self._positions_version != self.version:
+                snapshot_positions = None if self.snapshot is None else self.snapshot.positions
+                if snapshot_positions is not None and self.version == self.snapshot.manifest["graph_version"]:
+                    self._positions = snapshot_positions
+                elif not compute:
+                    return None
+                else:
+                    initial = None
+                    if self._positions is not None and len(self._positions):
+                        initial = {node: self._positions[node] for node in range(len(self._positions))}
+                    positions = nx.spring_layout(self.graph, k=1, iterations=50, pos=initial, seed=0)
+                    self._positions = np.array([positions[node] for node in range(self.graph.number_of_nodes())],
+                                               dtype=np.float32).reshape(-1, 2)
+                self._positions_version = self.version
+            return self._positions
 
-    def build_graph(self, splits, llm, embedding_model):
-        self._add_nodes(splits)
-        embeddings = self._create_embeddings(splits, embedding_model)
-        self._extract_concepts(splits, llm)
-        self._add_edges(embeddings)
+    def transition_matrix(self):
+        """
+        Returns (transition, dangling): the transposed random-walk transition matrix of the weighted
+        graph as float32 CSR, so a walk step is transition @ scores, and a mask of nodes without edges.
+        Built once per graph version, from the snapshot arrays when the graph has not changed since load.
+        """
+        with self._lazy_lock:
+            if self._transition_matrix is None or self._transition_matrix_version != self.version:
+                if self._graph is None:
+                    indptr, indices = self.snapshot.edge_indptr, self.snapshot.edge_indices
+                    weights = self.snapshot.edge_weights
+                else:
+                    indptr, indices, attributes = edge_csr(self._graph, self._graph.number_of_nodes())
+                    weights = attributes['weight']
+                num_nodes = len(indptr) - 1
+                adjacency = sparse.csr_matrix((np.asarray(weights, dtype=np.float32), indices, indptr),
+                                              shape=(num_nodes, num_nodes))
+                out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+                dangling = out_weight == 0
+                inverse = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=~dangling)
+                self._transition_matrix = (sparse.diags(inverse.astype(np.float32)) @ adjacency).T.tocsr()
+                self._transition_dangling = dangling
+                self._transition_matrix_version = self.version
+            return self._transition_matrix, self._transition_dangling
 
-    def _add_nodes(self, splits):
+    def personalized_pagerank(self, seeds, alpha=0.85, max_iter=50, tol=1e-6):
         """
-        Adds nodes to the graph from the document splits.
+        Runs personalized PageRank by power iteration from a {node: weight} dict of seed nodes, returning
+        (scores, iterations). Walks restart at the seeds with probability 1 - alpha, and the rank of nodes
+        without edges is sent back to the seeds.
+        """
+        transition, dangling = self.transition_matrix()
+        personalization = np.zeros(transition.shape[0], dtype=np.float32)
+        for node, weight in seeds.items():
+            personalization[node] += weight
+        personalization /= personalization.sum() or 1.0
+
+        scores = personalization.copy()
+        for iteration in range(1, max_iter + 1):
+            previous = scores
+            scores = alpha * (transition @ previous + previous[dangling].sum() * personalization) \
+                + (1 - alpha) * personalization
+            if np.abs(scores - previous).sum() < tol:
+                break
+        return scores, iteration
+
+    @staticmethod
+    def _content_hash(content):
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+    @property
+    def nlp(self):
+        """
+        The spaCy model, loaded on first use so opening a saved graph does not pay for it.
+        """
+        if self._nlp is None:
+            self._nlp = self._load_spacy_model()
+        return self._nlp
+
+    def save(self, path):
+        """
+        Saves the graph as a snapshot directory (see graph_snapshot.save_snapshot) and returns its manifest.
+        """
+        return save_snapshot(self, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Opens a snapshot written by save(). Embeddings and index arrays are memory-mapped and the
+        nx.Graph is built lazily, so opening is independent of the graph size.
+        """
+        snapshot = GraphSnapshot(path)
+        manifest = snapshot.manifest
+        knowledge_graph = cls(similarity_mode=manifest["similarity_mode"], knn_k=manifest["knn_k"], **kwargs)
+        knowledge_graph.snapshot = snapshot
+        knowledge_graph._graph = None
+        knowledge_graph.edges_threshold = manifest["edges_threshold"]
+        knowledge_graph.version = manifest["graph_version"]
+        knowledge_graph.embedding_model_name = manifest["embedding_model"]
+        knowledge_graph.llm_model_name = manifest["llm_model"]
+        knowledge_graph.embeddings = snapshot.embeddings
+        knowledge_graph.concept_names = list(snapshot.concept_names)
+        knowledge_graph.concept_vocab = {name: i for i, name in enumerate(knowledge_graph.concept_names)}
+        concept_indices = snapshot.concept_matrix_indices
+        knowledge_graph.concept_matrix = sparse.csr_matrix(
+            (np.ones(len(concept_indices), dtype=np.int32), concept_indices, snapshot.concept_matrix_indptr),
+            shape=(snapshot.num_nodes, len(knowledge_graph.concept_names)),
+        )
+        return knowledge_graph
+
+    def build_graph(self, splits, llm, embedding_model, embeddings=None):
+        """
+        Builds the graph from the document splits. Precomputed split embeddings can be passed in
+        to skip the embedding pass, e.g. the vectors already written to the vector store.
+        """
+        self.add_documents(splits, llm, embedding_model, embeddings=embeddings)
+
+    def add_documents(self, splits, llm, embedding_model, embeddings=None):
+        """
+        Incrementally adds document splits to the graph. Only the new splits are embedded and have
+        their concepts extracted, and only new-vs-existing and new-vs-new similarities are computed,
+        so the cost is proportional to the number of new splits. Returns the new node ids.
+        """
+        start_node = self.graph.number_of_nodes()
+        self.embedding_model_name = getattr(embedding_model, "model", self.embedding_model_name)
+        self.llm_model_name = getattr(llm, "model", self.llm_model_name)
+        self._add_nodes(splits, start_node)
+        if embeddings is None:
+            embeddings = self._create_embeddings(splits, embedding_model)
+        self._append_embeddings(np.asarray(embeddings, dtype=np.float32), start_node)
+        self._extract_concepts(splits, llm, start_node)
+        self._build_concept_index(start_node)
+        self._add_edges(self.embeddings, start_node)
+        self.version += 1
+        return list(range(start_node, start_node + len(splits)))
+
+    @staticmethod
+    def _grow(buffer, needed, filled):
+        """
+        Returns buffer if it holds at least needed rows, else a buffer of twice the capacity (or needed,
+        if larger) with the first filled rows copied over.
+        """
+        if len(buffer) >= needed:
+            return buffer
+        grown = np.empty((max(needed, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+        grown[:filled] = buffer[:filled]
+        return grown
+
+    def _append_embeddings(self, embeddings, start_node):
+        """
+        Appends the rows of the new nodes to the embedding matrix. self.embeddings is a view of the filled
+        part of a growable buffer, so an add copies only the new rows (amortized) instead of the whole matrix.
+        """
+        needed = start_node + len(embeddings)
+        buffer = self._embedding_buffer
+        # The buffer is only reusable while self.embeddings still is its view (not replaced or loaded)
+        if buffer is None or self.embeddings.base is not buffer or len(self.embeddings) != start_node \
+                or buffer.shape[1] != embeddings.shape[1]:
+            buffer = np.empty((needed,) + embeddings.shape[1:], dtype=np.float32)
+            if start_node:
+                buffer[:start_node] = self.embeddings[:start_node]
+        else:
+            buffer = self._grow(buffer, needed, start_node)
+        buffer[start_node:needed] = embeddings
+        self._embedding_buffer = buffer
+        self.embeddings = buffer[:needed]
+
+    def _add_nodes(self, splits, start_node=0):
+        """
+        Adds nodes to the graph from the document splits, numbering them from start_node.
         """
         for i, split in enumerate(splits):
-            self.graph.add_node(i, content=split.page_content)
+            self.graph.add_node(start_node + i, content=split.page_content)
 
     def _create_embeddings(self, splits, embedding_model):
         """
-        Creates embeddings for the document splits using the embedding model.
+        Creates float32 embeddings for the document splits using the embedding model.
         """
         texts = [split.page_content for split in splits]
-        return embedding_model.embed_documents(texts)
+        return np.asarray(embedding_model.embed_documents(texts), dtype=np.float32)
 
-    def _compute_similarities(self, embeddings):
+    def _compute_similarities(self, embeddings, other_embeddings=None):
         """
-        Computes the cosine similarity matrix for the embeddings.
+        Computes the cosine similarity matrix between the embeddings and other_embeddings
+        (or the embeddings themselves when other_embeddings is None).
         """
         from sklearn.metrics.pairwise import cosine_similarity
-        return cosine_similarity(embeddings)
+        return cosine_similarity(embeddings, other_embeddings)
 
     def _load_spacy_model(self):
         """
@@ -63,24 +360,27 @@ class KnowledgeGraph:
             spacy.cli.download("en_core_web_sm")
             return spacy.load("en_core_web_sm")
 
-    def _extract_concepts_and_entities(self, content, llm):
+    def _extract_named_entities(self, texts):
         """
-        Extracts concepts and named entities from the content using spaCy and a large language model.
+        Extracts named entities for all texts with spaCy as a separate batched stage. Only the NER
+        component runs, and documents are spread over ner_processes worker processes.
         """
-        if content in self.concept_cache:
-            return self.concept_cache[content]
+        disabled = [name for name in self.nlp.pipe_names if name not in self.NER_PIPES]
+        # Worker processes each load their own copy of the model, which only pays off for larger inputs
+        n_process = self.ner_processes if len(texts) >= 4 * self.ner_batch_size else 1
+        docs = self.nlp.pipe(texts, batch_size=self.ner_batch_size, n_process=n_process, disable=disabled)
+        return [[ent.text for ent in doc.ents if ent.label_ in self.NER_LABELS] for doc in docs]
 
-        # Extract named entities using spaCy
-        doc = self.nlp(content)
-        named_entities = [ent.text for ent in doc.ents if ent.label_ in ["PERSON", "ORG", "GPE", "WORK_OF_ART"]]
-
-        # Extract general concepts using LLM
+    async def _aextract_llm_concepts(self, content, llm):
+        """
+        Extracts general concepts (excluding named entities) from the content using a large language model.
+        """
         concept_extraction_prompt = PromptTemplate(
             input_variables=["text"],
-            template="Extract key concepts (excluding named entities) from the following text:\n\n{text}\n\nKey concepts:"
+            template=self.CONCEPT_EXTRACTION_TEMPLATE
         )
         concept_chain = concept_extraction_prompt | llm
-        response = concept_chain.invoke({"text": content})
+        response = await concept_chain.ainvoke({"text": content})
 
         # Check if response is an AIMessage object and get content
         if isinstance(response, AIMessage):
@@ -89,53 +389,234 @@ class KnowledgeGraph:
             general_concepts = response
 
         # Split the response into individual concepts
-        general_concepts = [concept.strip() for concept in general_concepts.split(',')]
+        return [concept.strip() for concept in general_concepts.split(',')]
 
-        # Combine named entities and general concepts
-        all_concepts = list(set(named_entities + general_concepts))
-
-        self.concept_cache[content] = all_concepts
-        return all_concepts
+    def _extract_concepts(self, splits, llm, start_node=0):
+        """
+        Extracts concepts for all document splits. See _aextract_concepts.
+        """
+        run_sync(self._aextract_concepts(splits, llm, start_node))
 
-    def _extract_concepts(self, splits, llm):
+    async def _aextract_concepts(self, splits, llm, start_node=0):
         """
-        Extracts concepts for all document splits using multi-threading.
+        Extracts concepts for all document splits. The LLM calls go through the bounded extraction
+        scheduler while spaCy NER runs as its own batched, process-parallel stage in a worker thread;
+        both results are merged per node afterwards.
         """
-        with ThreadPoolExecutor() as executor:
-            future_to_node = {executor.submit(self._extract_concepts_and_entities, split.page_content, llm): i
-                              for i, split in enumerate(splits)}
+        texts = [split.page_content for split in splits]
+        named_entities_future = asyncio.get_running_loop().run_in_executor(None, self._extract_named_entities, texts)
+
+        # Cached chunks never reach the scheduler, so they take no request slot
+        model_name = getattr(llm, "model", type(llm).__name__)
+        cache_keys = [self.concept_cache.make_key(text, model_name, self.CONCEPT_PROMPT_VERSION) for text in texts]
+        general_concepts = {i: self.concept_cache.get(cache_key) for i, cache_key in enumerate(cache_keys)}
+        misses = [(i, texts[i]) for i, concepts in general_concepts.items() if concepts is None]
+        general_concepts.update(await self.extraction_scheduler.run(
+            misses, lambda text: self._aextract_llm_concepts(text, llm), total=len(misses),
+            on_result=lambda i, concepts: self.concept_cache.set(cache_keys[i], concepts),
+        ))
+        named_entities = await named_entities_future
 
-            for future in tqdm(as_completed(future_to_node), total=len(splits),
-                               desc="Extracting concepts and entities"):
-                node = future_to_node[future]
-                concepts = future.result()
-                self.graph.nodes[node]['concepts'] = concepts
+        for i in range(len(texts)):
+            # Combine named entities and general concepts
+            concepts = list(set(named_entities[i] + general_concepts[i]))
+            self.graph.nodes[start_node + i]['concepts'] = concepts
+        self.extraction_metrics = self.extraction_scheduler.metrics.as_dict()
+        logger.debug("Concept extraction: %s, cache: %s", self.extraction_metrics, self.concept_cache.stats())
 
-    def _add_edges(self, embeddings):
+    def _add_edges(self, embeddings, start_node=0):
         """
         Adds edges to the graph based on the similarity of embeddings and shared concepts.
+        Candidate pairs come from a row-blocked similarity scan, their weights are computed
+        in bulk and all edges are inserted with a single add_edges_from call. Only pairs that
+        involve at least one node numbered start_node or higher are considered.
+        """
+        rows, cols, similarity_scores = self._similar_pairs(embeddings, start_node)
+        shared_counts = self._shared_concept_counts(rows, cols)
+        concept_counts = np.diff(self.concept_matrix.indptr)
+        edge_weights = self._calculate_edge_weights(rows, cols, similarity_scores, shared_counts, concept_counts)
+
+        self.graph.add_edges_from(
+            (node1, node2, {'weight': weight, 'similarity': similarity_score, 'shared_concept_count': shared})
+            for node1, node2, weight, similarity_score, shared in zip(
+                rows.tolist(), cols.tolist(), edge_weights.tolist(), similarity_scores.tolist(), shared_counts.tolist())
+        )
+
+    def _build_concept_index(self, start_node=0):
+        """
+        Lemmatizes every node's concepts once and builds the sparse chunk x concept incidence matrix (CSR),
+        where row i holds a 1 for each distinct lemmatized concept of node i; concept_nodes is its transpose.
+        Queries work on these ids and never lemmatize.
+        Rows for nodes below start_node are kept and only the new nodes are lemmatized.
+        """
+        lemmas = {}
+        indptr, indices = [0], []
+        for node in range(start_node, len(self.graph.nodes)):
+            concept_ids = set()
+            for concept in self.graph.nodes[node]['concepts']:
+                if concept not in lemmas:
+                    lemmas[concept] = self._lemmatize_concept(concept)
+                lemma = lemmas[concept]
+                if not lemma:
+                    continue
+                if lemma not in self.concept_vocab:
+                    self.concept_vocab[lemma] = len(self.concept_names)
+                    self.concept_names.append(lemma)
+                concept_ids.add(self.concept_vocab[lemma])
+            indices.extend(sorted(concept_ids))
+            indptr.append(len(indices))
+
+        # Rows are appended to growable CSR arrays (int32, so scipy wraps them without copying) and the
+        # transposed index is rebuilt lazily, so a batch costs O(batch) instead of O(all nodes)
+        # The buffers are only reusable while concept_matrix still wraps them (not replaced or loaded)
+        if self._concept_indptr is None or start_node == 0 or self.concept_matrix.shape[0] != start_node \
+                or self.concept_matrix.indptr.base is not self._concept_indptr:
+            existing = self.concept_matrix[:start_node]
+            self._concept_indptr = np.asarray(existing.indptr, dtype=np.int32) if start_node \
+                else np.zeros(1, dtype=np.int32)
+            self._concept_indices = np.asarray(existing.indices, dtype=np.int32)
+            self._concept_data = np.ones(len(self._concept_indices), dtype=np.int32)
+        existing_nnz = int(self._concept_indptr[start_node])
+        num_rows = start_node + len(indptr) - 1
+        nnz = existing_nnz + len(indices)
+        self._concept_indptr = self._grow(self._concept_indptr, num_rows + 1, start_node + 1)
+        self._concept_indptr[start_node + 1:num_rows + 1] = existing_nnz + np.asarray(indptr[1:], dtype=np.int32)
+        self._concept_indices = self._grow(self._concept_indices, nnz, existing_nnz)
+        self._concept_indices[existing_nnz:nnz] = indices
+        if len(self._concept_data) < nnz:
+            self._concept_data = np.ones(len(self._concept_indices), dtype=np.int32)
+        # New concepts widen the vocabulary, which only changes the shape
+        self.concept_matrix = sparse.csr_matrix(
+            (self._concept_data[:nnz], self._concept_indices[:nnz], self._concept_indptr[:num_rows + 1]),
+            shape=(num_rows, len(self.concept_names)), copy=False,
+        )
+
+    @property
+    def concept_nodes(self):
+        """
+        Inverted index from concept id to node ids (the transposed incidence matrix). Built on first use
+        after the concept index changes, not on every add_documents batch.
+        """
+        with self._lazy_lock:
+            if self._concept_nodes is None or self._concept_nodes_source is not self.concept_matrix:
+                self._concept_nodes = self.concept_matrix.T.tocsr()
+                self._concept_nodes_source = self.concept_matrix
+            return self._concept_nodes
+
+    def node_concept_ids(self, node):
         """
-        similarity_matrix = self._compute_similarities(embeddings)
-        num_nodes = len(self.graph.nodes)
+        Returns the sorted lemmatized concept ids of a node as an int32 array.
+        """
+        return self.concept_matrix.indices[self.concept_matrix.indptr[node]:self.concept_matrix.indptr[node + 1]]
+
+    def nodes_with_concept(self, concept_id):
+        """
+        Returns the ids of all nodes that mention the given concept id, using the inverted index.
+        """
+        return self.concept_nodes.indices[self.concept_nodes.indptr[concept_id]:self.concept_nodes.indptr[concept_id + 1]]
+
+    def _shared_concept_counts(self, rows, cols):
+        """
+        Counts the lemmatized concepts shared by each (row, col) node pair with one sparse
+        element-wise product of the two gathered incidence rows.
+        """
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64)
+        shared = self.concept_matrix[rows].multiply(self.concept_matrix[cols])
+        return np.asarray(shared.sum(axis=1)).ravel().astype(np.int64)
+
+    def shared_concepts(self, node1, node2):
+        """
+        Returns the lemmatized concepts two nodes have in common.
+        """
+        shared_ids = np.intersect1d(self.node_concept_ids(node1), self.node_concept_ids(node2), assume_unique=True)
+        return [self.concept_names[concept_id] for concept_id in shared_ids]
+
+    def _similar_pairs(self, embeddings, start_node=0):
+        """
+        Returns the (row, col, similarity) arrays of node pairs with row < col and col >= start_node
+        whose cosine similarity is above the edges threshold, using the configured similarity mode.
+        """
+        if self.similarity_mode == "knn":
+            return self._knn_similar_pairs(embeddings, start_node)
+        return self._exact_similar_pairs(embeddings, start_node)
+
+    def _exact_similar_pairs(self, embeddings, start_node=0):
+        """
+        Scans the similarity matrix in row blocks so at most edge_block_size x N scores are
+        held in memory at once, keeping the above-threshold upper-triangle pairs. Columns below
+        start_node are skipped, so an incremental add only scores pairs touching new nodes.
+        """
+        embeddings = np.asarray(embeddings)
+        num_nodes = len(embeddings)
+        rows, cols, similarity_scores = [], [], []
+
+        for start in tqdm(range(0, num_nodes, self.edge_block_size), desc="Adding edges"):
+            stop = min(start + self.edge_block_size, num_nodes)
+            col_start = max(start, start_node)
+            # Block covers rows [start, stop) against columns [col_start, N); the diagonal offset
+            # keeps only global col > global row
+            block = self._compute_similarities(embeddings[start:stop], embeddings[col_start:])
+            mask = np.triu(block > self.edges_threshold, k=start - col_start + 1)
+            block_rows, block_cols = np.nonzero(mask)
+            rows.append(block_rows + start)
+            cols.append(block_cols + col_start)
+            similarity_scores.append(block[block_rows, block_cols])
+
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(similarity_scores)
+
+    def _knn_similar_pairs(self, embeddings, start_node=0):
+        """
+        Links each chunk to its knn_k nearest neighbours above the edges threshold using an
+        in-process HNSW index, so no N x N matrix is ever allocated. The index is kept between
+        calls; nodes from start_node on are added to it and searched against everything indexed.
+        Existing nodes are not re-searched, so they only link to new nodes that rank them in their top k.
+        """
+        import faiss
+
+        vectors = np.array(embeddings, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        num_nodes, dim = vectors.shape
+        if self._ann_index is None or self._ann_index.ntotal != start_node:
+            self._ann_index = faiss.IndexHNSWFlat(dim, self.knn_hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            self._ann_index.hnsw.efSearch = self.knn_ef_search
+            self._ann_index.add(vectors[:start_node])
+        index = self._ann_index
+        index.add(vectors[start_node:])
+
+        # k + 1 because every chunk finds itself as its own nearest neighbour
+        k = min(self.knn_k + 1, num_nodes)
+        rows, cols, similarity_scores = [], [], []
+        for start in tqdm(range(start_node, num_nodes, self.edge_block_size), desc="Adding edges"):
+            stop = min(start + self.edge_block_size, num_nodes)
+            scores, neighbors = index.search(vectors[start:stop], k)
+            block_rows = np.repeat(np.arange(start, stop), k)
+            neighbors, scores = neighbors.ravel(), scores.ravel()
+            keep = (neighbors >= 0) & (neighbors != block_rows) & (scores > self.edges_threshold)
+            rows.append(np.minimum(block_rows[keep], neighbors[keep]))
+            cols.append(np.maximum(block_rows[keep], neighbors[keep]))
+            similarity_scores.append(scores[keep].astype(np.float64))
 
-        for node1 in tqdm(range(num_nodes), desc="Adding edges"):
-            for node2 in range(node1 + 1, num_nodes):
-                similarity_score = similarity_matrix[node1][node2]
-                if similarity_score > self.edges_threshold:
-                    shared_concepts = set(self.graph.nodes[node1]['concepts']) & set(
-                        self.graph.nodes[node2]['concepts'])
-                    edge_weight = self._calculate_edge_weight(node1, node2, similarity_score, shared_concepts)
-                    self.graph.add_edge(node1, node2, weight=edge_weight,
-                                        similarity=similarity_score,
-                                        shared_concepts=list(shared_concepts))
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        rows, cols, similarity_scores = np.concatenate(rows), np.concatenate(cols), np.concatenate(similarity_scores)
+        # A pair found from both ends is kept once
+        _, first = np.unique(rows * num_nodes + cols, return_index=True)
+        return rows[first], cols[first], similarity_scores[first]
 
-    def _calculate_edge_weight(self, node1, node2, similarity_score, shared_concepts, alpha=0.7, beta=0.3):
+    def _calculate_edge_weights(self, rows, cols, similarity_scores, shared_counts, concept_counts,
+                                alpha=0.7, beta=0.3):
         """
-        Calculates the weight of an edge based on similarity score and shared concepts.
+        Calculates edge weights for arrays of node pairs based on similarity scores and shared concepts.
+        The shared-concept term is normalized by the smaller of the two nodes' concept counts.
         """
-        max_possible_shared = min(len(self.graph.nodes[node1]['concepts']), len(self.graph.nodes[node2]['concepts']))
-        normalized_shared_concepts = len(shared_concepts) / max_possible_shared if max_possible_shared > 0 else 0
-        return alpha * similarity_score + beta * normalized_shared_concepts
+        max_possible_shared = np.minimum(concept_counts[rows], concept_counts[cols])
+        normalized_shared_concepts = np.divide(shared_counts, max_possible_shared,
+                                               out=np.zeros(len(shared_counts)),
+                                               where=max_possible_shared > 0)
+        return alpha * similarity_scores + beta * normalized_shared_concepts
 
     def _lemmatize_concept(self, concept):
         """
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+class LLMCache:
+    def __init__(self, path="../../../data/graph_cache/llm_cache.sqlite", max_entries=100_000):
+        """
+        Initializes a disk-backed, size-bounded LRU cache for LLM results stored in SQLite.
+        Values are JSON-encoded, so anything json.dumps accepts can be cached.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+        self._size = self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(content, model, prompt_version):
+        """
+        Builds a content-addressed key from the input text, the model name and the prompt version.
+        """
+        digest = hashlib.sha256()
+        for part in (str(model), str(prompt_version), content):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None on a miss, and marks the entry as recently used.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._connection:
+                self._connection.execute("UPDATE cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Stores value under key and evicts the least recently used entries beyond max_entries.
+        """
+        with self._lock, self._connection:
+            exists = self._connection.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, last_access) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            if not exists:
+                self._size += 1
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                self._connection.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_access LIMIT ?)", (excess,)
+                )
+                self._size -= excess
+                self.evictions += excess
+
+    def stats(self):
+        """
+        Returns the hit/miss/eviction counters and the current number of entries.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": self._size}
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM cache")
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
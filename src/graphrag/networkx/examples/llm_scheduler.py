@@ -0,0 +1,137 @@
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+_DONE = object()
+
+
+def run_sync(coroutine):
+    """
+    Runs a coroutine to completion from synchronous code. Inside an already running event loop
+    (e.g. a Jupyter notebook) it is run on a fresh loop in a helper thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+class SchedulerMetrics:
+    def __init__(self):
+        """
+        Counters for one scheduler run, plus one sample per interval of (elapsed seconds, completions
+        per second, queue depth, requests in flight).
+        """
+        self.started_at = time.perf_counter()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.samples = []
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    @property
+    def throughput(self):
+        return self.completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {"submitted": self.submitted, "completed": self.completed, "failed": self.failed,
+                "retries": self.retries, "elapsed_seconds": self.elapsed, "throughput_per_second": self.throughput,
+                "peak_queue_depth": max((sample[2] for sample in self.samples), default=self.queue_depth)}
+
+
+class LLMScheduler:
+    def __init__(self, max_in_flight=4, queue_size=64, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 metrics_interval=1.0, desc="LLM requests"):
+        """
+        Runs async LLM calls with at most max_in_flight requests outstanding. Inputs are streamed through a
+        bounded queue of queue_size items, so a slow server pushes back on the producer instead of piling
+        up requests. Failed calls are retried up to max_retries times with jittered exponential backoff.
+        """
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics_interval = metrics_interval
+        self.desc = desc
+        self.metrics = None
+
+    async def run(self, items, worker, total=None, on_result=None):
+        """
+        Calls `await worker(payload)` for every (key, payload) in items, which may be a regular or an async
+        iterable, and returns a dict of key -> result. on_result(key, result) is called as each result arrives.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        metrics = self.metrics = SchedulerMetrics()
+        results = {}
+        progress = tqdm(total=total, desc=self.desc)
+
+        async def produce():
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await queue.put(item)
+                    metrics.submitted += 1
+            else:
+                for item in items:
+                    await queue.put(item)
+                    metrics.submitted += 1
+            for _ in range(self.max_in_flight):
+                await queue.put(_DONE)
+
+        async def consume():
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    return
+                key, payload = item
+                metrics.in_flight += 1
+                try:
+                    results[key] = await self._call_with_retry(worker, payload, metrics)
+                finally:
+                    metrics.in_flight -= 1
+                metrics.completed += 1
+                progress.update(1)
+                if on_result is not None:
+                    on_result(key, results[key])
+
+        async def monitor():
+            last_completed = 0
+            while True:
+                await asyncio.sleep(self.metrics_interval)
+                metrics.queue_depth = queue.qsize()
+                rate = (metrics.completed - last_completed) / self.metrics_interval
+                last_completed = metrics.completed
+                metrics.samples.append((metrics.elapsed, rate, metrics.queue_depth, metrics.in_flight))
+                progress.set_postfix(rate=f"{rate:.1f}/s", queue=metrics.queue_depth, in_flight=metrics.in_flight,
+                                     retries=metrics.retries)
+
+        monitor_task = asyncio.create_task(monitor())
+        try:
+            await asyncio.gather(produce(), *(consume() for _ in range(self.max_in_flight)))
+        finally:
+            monitor_task.cancel()
+            progress.close()
+        return results
+
+    async def _call_with_retry(self, worker, payload, metrics):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await worker(payload)
+            except Exception:
+                if attempt == self.max_retries:
+                    metrics.failed += 1
+                    raise
+                metrics.retries += 1
+                # Equal jitter keeps some minimum spacing while spreading retries from concurrent workers
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                await asyncio.sleep(delay / 2 + random.uniform(0, delay / 2))
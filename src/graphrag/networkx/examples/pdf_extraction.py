@@ -0,0 +1,98 @@
+import os
+import io
+import time
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# Each worker process parses the PDF once, in _init_worker, and keeps the reader for all its page ranges
+_worker_reader = None
+
+
+def _open_reader(source):
+    return PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _init_worker(source):
+    global _worker_reader
+    _worker_reader = _open_reader(source)
+
+
+def _extract_page_range(start, stop, reader=None):
+    # reader is passed in-process; only pool workers fall back to the per-process _worker_reader
+    reader = reader or _worker_reader
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+class PDFExtractor:
+    def __init__(self, max_workers=None, pages_per_task=16, max_pending_tasks=None, min_parallel_pages=64):
+        """
+        Extracts PDF page text with a process pool. The page range is cut into tasks of pages_per_task pages,
+        and at most max_pending_tasks tasks (twice the worker count by default) are submitted or finished but
+        not yet consumed, so memory stays bounded however far the workers run ahead of the consumer.
+        PDFs with fewer than min_parallel_pages pages are read in-process, where starting the pool costs
+        more than it saves.
+        """
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 1) - 1)
+        self.pages_per_task = pages_per_task
+        self.max_pending_tasks = max_pending_tasks or 2 * self.max_workers
+        self.min_parallel_pages = min_parallel_pages
+        self.metrics = None
+
+    def iter_pages(self, source):
+        """
+        Yields one Document per page, in page order, with the page number in its metadata. source is a
+        path, the PDF bytes, or a binary file object. Pages are yielded as soon as their task finishes, so
+        splitting can start while later pages are still being extracted.
+        """
+        if hasattr(source, "read"):
+            source = source.read()
+        reader = _open_reader(source)
+        num_pages = len(reader.pages)
+        started_at = time.perf_counter()
+        ranges = [(start, min(start + self.pages_per_task, num_pages))
+                  for start in range(0, num_pages, self.pages_per_task)]
+
+        if num_pages < self.min_parallel_pages or self.max_workers == 1:
+            # A local reader, not the module global: several generators may be extracting at once (Streamlit sessions)
+            texts = (_extract_page_range(start, stop, reader) for start, stop in ranges)
+            yield from self._documents(ranges, texts)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(source,)) as executor:
+                yield from self._documents(ranges, self._submit_in_order(executor, ranges))
+
+        elapsed = time.perf_counter() - started_at
+        self.metrics = {"pages": num_pages, "elapsed_seconds": elapsed,
+                        "pages_per_second": num_pages / elapsed if elapsed > 0 else 0.0}
+        logger.debug("PDF extraction: %s", self.metrics)
+
+    def _submit_in_order(self, executor, ranges):
+        """
+        Yields the page texts of each range in order, keeping at most max_pending_tasks tasks outstanding.
+        """
+        pending = deque()
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < self.max_pending_tasks:
+                pending.append(executor.submit(_extract_page_range, *ranges[next_range]))
+                next_range += 1
+            yield pending.popleft().result()
+
+    @staticmethod
+    def _documents(ranges, texts):
+        for (start, _), page_texts in zip(ranges, texts):
+            for offset, text in enumerate(page_texts):
+                yield Document(page_content=text, metadata={"page": start + offset})
+
+    def iter_splits(self, source, text_splitter):
+        """
+        Streams the pages of a PDF through a text splitter (e.g. RecursiveCharacterTextSplitter) one
+        page at a time and yields the splits in order.
+        """
+        for page in self.iter_pages(source):
+            yield from text_splitter.split_documents([page])
@@ -1,17 +1,67 @@
 
 import heapq
-from typing import Tuple, List, Dict
+import asyncio
+import threading
+import numpy as np
+from typing import Tuple, List, Dict, Iterator, AsyncIterator
 from langchain_core.prompts import PromptTemplate
 from langchain_ollama import ChatOllama
 from langchain.schema import AIMessage
 
+from answer_policy import AlwaysCheckPolicy, TraversalState
+from context_buffer import ContextBuffer, estimate_tokens
+from community_summaries import CommunitySummaries
+from query_events import (SeedsSelected, NodeVisited, AnswerChecked, AnswerToken, QueryCompleted,
+                          AnswerCheckRequest)
+
 class QueryEngine:
-    def __init__(self, vector_store, knowledge_graph):
+    RETRIEVAL_MODES = ("traversal", "pagerank", "global")
+
+    def __init__(self, vector_store, knowledge_graph, embedding_model=None, answer_policy=None,
+                 retrieval_mode="traversal", count_tokens=None):
+        """
+        count_tokens(text) -> int measures context against max_context_length. Pass the model's own
+        tokenizer for exact budgets; the default is a local characters-per-token estimate, so counting
+        never needs network access (ChatOllama.get_num_tokens would download a GPT-2 tokenizer).
+        """
+        if retrieval_mode not in self.RETRIEVAL_MODES:
+            raise ValueError(f"retrieval_mode must be one of {self.RETRIEVAL_MODES}, got {retrieval_mode!r}")
         self.vector_store = vector_store
         self.knowledge_graph = knowledge_graph
+        self.embedding_model = embedding_model or vector_store.embeddings
         self.llm = ChatOllama(model="llama3.2", temperature=0)
+        # Token budget for the accumulated traversal context, enforced by ContextBuffer
         self.max_context_length = 4000
+        self.context_eviction = "lowest_weight"
+        self.num_seed_documents = 5
         self.answer_check_chain = self._create_answer_check_chain()
+        self.response_chain = self._create_response_chain()
+        # Decides after which visited nodes the answer-check LLM call is made; AlwaysCheckPolicy checks every node
+        self.answer_policy = answer_policy or AlwaysCheckPolicy()
+        self.count_tokens = count_tokens or estimate_tokens
+        self._thread_state = threading.local()
+        # "traversal" runs the Dijkstra-like walk with answer checks; "pagerank" ranks nodes by personalized
+        # PageRank from the seeds and answers with a single LLM call
+        self.retrieval_mode = retrieval_mode
+        self.pagerank_alpha = 0.85
+        self.pagerank_max_iter = 50
+        self.pagerank_tol = 1e-6
+        self.pagerank_top_k = 20
+        # "global" answers from LLM summaries of graph communities, built on first use if not built ahead
+        self.community_summaries = CommunitySummaries(knowledge_graph, cache=knowledge_graph.concept_cache)
+        self.global_top_communities = 10
+
+    @property
+    def last_traversal_stats(self):
+        """
+        Stats of the last query finished by the calling thread, so threads sharing one QueryEngine
+        (e.g. Streamlit sessions) never see each other's stats.
+        """
+        return getattr(self._thread_state, "stats", None)
+
+    @last_traversal_stats.setter
+    def last_traversal_stats(self, stats):
+        self._thread_state.stats = stats
 
     def _create_answer_check_chain(self):
         """
@@ -23,42 +73,64 @@ class QueryEngine:
         )
         return answer_check_prompt | self.llm
 
+    @staticmethod
+    def _parse_answer_check(response) -> Tuple[bool, str]:
+        if isinstance(response, AIMessage):
+            response = response.content
+        is_complete = "Yes" in response
+        answer = response.split("Answer:")[-1].strip() if is_complete else ""
+        return is_complete, answer
+
     def _check_answer(self, query: str, context: str) -> Tuple[bool, str]:
         """
         Checks if the current context provides a complete answer to the query.
         """
-        response = self.answer_check_chain.invoke({"query": query, "context": context})
-        is_complete = "Yes" in response
-        answer = response.split("Answer:")[-1].strip() if is_complete else ""
-        return is_complete, answer
+        return self._parse_answer_check(self.answer_check_chain.invoke({"query": query, "context": context}))
 
-    def _expand_context(self, query: str, relevant_docs) -> Tuple[str, List[int], Dict[int, str], str]:
+    async def _acheck_answer(self, query: str, context: str) -> Tuple[bool, str]:
+        return self._parse_answer_check(await self.answer_check_chain.ainvoke({"query": query, "context": context}))
+
+    def _create_response_chain(self):
+        """
+        Creates the chain that answers the query from the gathered context when no check found a complete answer.
         """
-        Expands the context by traversing the knowledge graph using a Dijkstra-like approach.
+        response_prompt = PromptTemplate(
+            input_variables=["query", "context"],
+            template="Based on the following context, please answer the query.\n\nContext: {context}\n\nQuery: {query}\n\nAnswer:"
+        )
+        return response_prompt | self.llm
+
+    def _traverse(self, query: str, seeds, query_embedding=None):
+        """
+        Expands the context by traversing the knowledge graph using a Dijkstra-like approach,
+        starting from the (node, priority) seeds. The answer policy decides after which nodes the
+        completeness check runs; the context is held to max_context_length tokens by a ContextBuffer.
+
+        This is a generator: it yields a NodeVisited event per node, and an AnswerCheckRequest whenever
+        a check is due, to which the driver sends back (is_complete, answer). It makes no LLM calls itself,
+        so sync and async drivers share it. Returns (context, traversal_path, filtered_content, answer, stats),
+        where answer is "" when no check found a complete answer. Like _rank, the path and filtered content
+        only hold the nodes left in the context.
+
+        Nodes are visited in order of increasing distance, so with lowest_weight eviction each new node weighs
+        no more than the ones already kept. Once a node that fits the budget on its own is evicted right away,
+        the context is full and no later node can change it, so the walk stops there.
         """
-        expanded_context = ""
-        traversal_path = []
+        context = ContextBuffer(self.count_tokens, self.max_context_length, self.context_eviction)
+        visited = set()
         visited_concepts = set()
-        filtered_content = {}
         final_answer = ""
 
         priority_queue = []
         distances = {}
+        graph = self.knowledge_graph.graph_view()
+        state = TraversalState(query, query_embedding)
 
-        # Initialize priority queue with closest nodes from relevant docs
-        for doc in relevant_docs:
-            # Find the most similar node in the knowledge graph for each relevant document
-            closest_nodes = self.vector_store.similarity_search_with_score(doc.page_content, k=1)
-            closest_node_content, similarity_score = closest_nodes[0]
-
-            # Get the corresponding node in our knowledge graph
-            closest_node = next(n for n in self.knowledge_graph.graph.nodes if
-                                self.knowledge_graph.graph.nodes[n]['content'] == closest_node_content.page_content)
-
-            # Initialize priority (inverse of similarity score for min-heap behavior)
-            priority = 1 / similarity_score
-            heapq.heappush(priority_queue, (priority, closest_node))
-            distances[closest_node] = priority
+        # Initialize priority queue with the seed nodes from the vector search
+        for seed_node, priority in seeds:
+            if priority < distances.get(seed_node, float('inf')):
+                heapq.heappush(priority_queue, (priority, seed_node))
+                distances[seed_node] = priority
 
         while priority_queue:
             # Get the node with the highest priority (lowest distance value)
@@ -68,31 +140,39 @@ class QueryEngine:
             if current_priority > distances.get(current_node, float('inf')):
                 continue
 
-            if current_node not in traversal_path:
-                traversal_path.append(current_node)
-                node_content = self.knowledge_graph.graph.nodes[current_node]['content']
-                node_concepts = self.knowledge_graph.graph.nodes[current_node]['concepts']
+            if current_node not in visited:
+                visited.add(current_node)
+                node_content = graph.content(current_node)
 
-                # Add node content to our accumulated context
-                filtered_content[current_node] = node_content
-                expanded_context += "\n" + node_content if expanded_context else node_content
+                # Add node content to our accumulated context; closer nodes (lower priority) weigh more
+                node_tokens = context.add(current_node, node_content, weight=1 / current_priority)
+                if current_node not in context:
+                    # Evicted as soon as it was added: the context is unchanged, so there is nothing to check
+                    if node_tokens <= context.max_tokens and self.context_eviction == "lowest_weight":
+                        break
+                    continue
 
-                # Check if we have a complete answer with the current context
-                is_complete, answer = self._check_answer(query, expanded_context)
-                if is_complete:
-                    final_answer = answer
-                    break
+                state.record_node(node_tokens, self.knowledge_graph.embeddings[current_node])
+                yield NodeVisited(current_node, state.nodes_visited, current_priority, node_content,
+                                  context.total_tokens)
 
-                # Process the concepts of the current node
-                node_concepts_set = set(self.knowledge_graph._lemmatize_concept(c) for c in node_concepts)
-                if not node_concepts_set.issubset(visited_concepts):
-                    visited_concepts.update(node_concepts_set)
+                # Check if we have a complete answer with the current context, when the policy asks for it
+                if self.answer_policy.should_check(state):
+                    state.record_check()
+                    is_complete, answer = yield AnswerCheckRequest(current_node, context.text)
+                    if is_complete:
+                        final_answer = answer
+                        break
+                else:
+                    state.record_skip()
 
-                    # Explore neighbors
-                    for neighbor in self.knowledge_graph.graph.neighbors(current_node):
-                        edge_data = self.knowledge_graph.graph[current_node][neighbor]
-                        edge_weight = edge_data['weight']
+                # Process the concepts of the current node as lemmatized concept ids from the build-time index
+                node_concept_ids = self.knowledge_graph.node_concept_ids(current_node).tolist()
+                if not visited_concepts.issuperset(node_concept_ids):
+                    visited_concepts.update(node_concept_ids)
 
+                    # Explore neighbors
+                    for neighbor, edge_weight in graph.weighted_neighbors(current_node):
                         # Calculate new distance (priority) to the neighbor
                         distance = current_priority + (1 / edge_weight)
 
@@ -101,33 +181,220 @@ class QueryEngine:
                             distances[neighbor] = distance
                             heapq.heappush(priority_queue, (distance, neighbor))
 
-            # If we found a final answer, break out of the main loop
-            if final_answer:
+        # Evicted nodes are not in the final context, so they are not part of the reported path
+        traversal_path = context.keys
+        filtered_content = {node: graph.content(node) for node in traversal_path}
+        stats = {"policy": self.answer_policy.name, **state.stats(),
+                 "context_tokens": context.total_tokens, "evicted_nodes": len(context.evicted)}
+        return context.text, traversal_path, filtered_content, final_answer, stats
+
+    def _rank(self, query: str, seeds, query_embedding=None):
+        """
+        Alternative to _traverse with the same generator protocol and return value. Ranks all nodes by
+        personalized PageRank from the seeds (weighted by their similarity, the inverse of the priority)
+        and packs the top pagerank_top_k into the context in rank order. It never requests an answer
+        check, so the drivers answer with a single LLM call.
+        """
+        context = ContextBuffer(self.count_tokens, self.max_context_length, self.context_eviction)
+        graph = self.knowledge_graph.graph_view()
+        seed_weights = {}
+        for node, priority in seeds:
+            seed_weights[node] = max(seed_weights.get(node, 0.0), 1 / priority)
+
+        ranked = []
+        iterations = 0
+        if seed_weights:
+            scores, iterations = self.knowledge_graph.personalized_pagerank(
+                seed_weights, self.pagerank_alpha, self.pagerank_max_iter, self.pagerank_tol)
+            top_k = min(self.pagerank_top_k, np.count_nonzero(scores))
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k] if top_k else np.empty(0, dtype=np.int64)
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
+
+        for step, node in enumerate(ranked, 1):
+            node_content = graph.content(node)
+            # Lower-ranked nodes are the first to go when the token budget is exceeded
+            context.add(node, node_content, weight=float(scores[node]))
+            yield NodeVisited(node, step, float(scores[node]), node_content, context.total_tokens)
+
+        # Evicted nodes never reached the LLM, so they are not part of the reported path
+        traversal_path = context.keys
+        filtered_content = {node: graph.content(node) for node in traversal_path}
+        stats = {"policy": "pagerank", "nodes_visited": len(ranked), "llm_checks": 0, "llm_checks_saved": 0,
+                 "pagerank_iterations": iterations, "context_tokens": context.total_tokens,
+                 "evicted_nodes": len(context.evicted)}
+        return context.text, traversal_path, filtered_content, "", stats
+
+    def _summarize(self, query: str, seeds, query_embedding=None):
+        """
+        Alternative to _traverse for broad questions, with the same generator protocol and return value.
+        Packs the summaries of the global_top_communities communities closest to the query into the
+        context, so the answer takes a single LLM call. Each community is reported as its hub node,
+        with the summary as that node's filtered content. The drivers build the summaries beforehand, as
+        the sync and async paths have to build them differently; seeds are not used.
+        """
+        if query_embedding is None:
+            query_embedding = self.embedding_model.embed_query(query)
+        context = ContextBuffer(self.count_tokens, self.max_context_length, self.context_eviction)
+        order, similarities = self.community_summaries.rank(query_embedding)
+        summaries = {}
+        for step, index in enumerate(order[:self.global_top_communities].tolist(), 1):
+            community = self.community_summaries.communities[index]
+            summaries[community["hub"]] = community["summary"]
+            context.add(community["hub"], community["summary"], weight=float(similarities[index]))
+            yield NodeVisited(community["hub"], step, float(similarities[index]), community["summary"],
+                              context.total_tokens)
+
+        traversal_path = context.keys
+        filtered_content = {node: summaries[node] for node in traversal_path}
+        stats = {"policy": "global", "communities": len(self.community_summaries.communities),
+                 "nodes_visited": len(summaries), "llm_checks": 0, "llm_checks_saved": 0,
+                 "context_tokens": context.total_tokens, "evicted_nodes": len(context.evicted)}
+        return context.text, traversal_path, filtered_content, "", stats
+
+    def _expand(self, query: str, seeds, query_embedding=None):
+        if self.retrieval_mode == "pagerank":
+            return self._rank(query, seeds, query_embedding)
+        if self.retrieval_mode == "global":
+            return self._summarize(query, seeds, query_embedding)
+        return self._traverse(query, seeds, query_embedding)
+
+    def stream_query(self, query: str, query_embedding=None) -> Iterator:
+        """
+        Processes a query like query(), yielding events as it goes: SeedsSelected, then NodeVisited and
+        AnswerChecked while the graph is traversed, then AnswerToken pieces of the answer streamed from
+        the LLM, and finally QueryCompleted with the answer, traversal path and filtered content.
+        query_embedding is reused when the caller has already embedded the query.
+        """
+        if query_embedding is None:
+            query_embedding = self.embedding_model.embed_query(query)
+        if self.retrieval_mode == "global":
+            # Global mode ranks community summaries, not chunks, so no vector search is needed
+            seeds = []
+            if not self.community_summaries.is_current():
+                self.community_summaries.build(self.llm)
+        else:
+            seeds = self._retrieve_seeds(query, query_embedding)
+        yield SeedsSelected(seeds)
+
+        traversal = self._expand(query, seeds, query_embedding)
+        reply = None
+        while True:
+            try:
+                event = traversal.send(reply)
+            except StopIteration as stop:
+                context, traversal_path, filtered_content, final_answer, stats = stop.value
                 break
+            reply = None
+            if isinstance(event, AnswerCheckRequest):
+                reply = self._check_answer(query, event.context)
+                yield AnswerChecked(event.node, *reply)
+            else:
+                yield event
 
-        # If we haven't found a complete answer, generate one using the LLM
-        if not final_answer:
-            response_prompt = PromptTemplate(
-                input_variables=["query", "context"],
-                template="Based on the following context, please answer the query.\n\nContext: {context}\n\nQuery: {query}\n\nAnswer:"
-            )
-            response_chain = response_prompt | self.llm
-            input_data = {"query": query, "context": expanded_context}
-            final_answer = response_chain.invoke(input_data)
+        if final_answer:
+            yield AnswerToken(final_answer)
+        else:
+            # No check found a complete answer, so generate one from the gathered context
+            pieces = []
+            for chunk in self.response_chain.stream({"query": query, "context": context}):
+                text = chunk.content if isinstance(chunk, AIMessage) else str(chunk)
+                if text:
+                    pieces.append(text)
+                    yield AnswerToken(text)
+            final_answer = "".join(pieces)
 
-        return expanded_context, traversal_path, filtered_content, final_answer
+        self.last_traversal_stats = stats
+        yield QueryCompleted(final_answer, traversal_path, filtered_content, stats)
 
-    def query(self, query: str) -> Tuple[str, List[int], Dict[int, str]]:
+    def query(self, query: str, query_embedding=None) -> Tuple[str, List[int], Dict[int, str]]:
         """
         Processes a query by retrieving relevant documents, expanding the context, and generating the final answer.
         """
-        relevant_docs = self._retrieve_relevant_documents(query)
-        expanded_context, traversal_path, filtered_content, final_answer = self._expand_context(query, relevant_docs)
-        return final_answer, traversal_path, filtered_content
+        for event in self.stream_query(query, query_embedding):
+            if isinstance(event, QueryCompleted):
+                return event.answer, event.traversal_path, event.filtered_content
 
-    def _retrieve_relevant_documents(self, query: str):
+    async def astream_query(self, query: str, query_embedding=None) -> AsyncIterator:
         """
-        Retrieves relevant documents based on the query using the vector store.
+        Async version of stream_query yielding the same events. The query is embedded with aembed_query,
+        the vector search runs in the default executor, and the LLM calls use ainvoke and astream. All
+        traversal state is local to the call, so concurrent queries can share one QueryEngine; read the
+        stats from the QueryCompleted event, as last_traversal_stats only holds the last query to finish.
         """
-        retriever = self.vector_store.as_retriever(search_type="similarity", search_kwargs={"k": 5})
-        return retriever.get_relevant_documents(query)
+        loop = asyncio.get_running_loop()
+        if query_embedding is None:
+            query_embedding = await self.embedding_model.aembed_query(query)
+        if self.retrieval_mode == "global":
+            seeds = []
+            if not self.community_summaries.is_current():
+                # Awaited rather than run through build(), which would block the loop and every other query
+                await self.community_summaries.abuild(self.llm)
+        else:
+            seeds = await loop.run_in_executor(None, self._retrieve_seeds, query, query_embedding)
+        yield SeedsSelected(seeds)
+
+        traversal = self._expand(query, seeds, query_embedding)
+        reply = None
+        while True:
+            try:
+                event = traversal.send(reply)
+            except StopIteration as stop:
+                context, traversal_path, filtered_content, final_answer, stats = stop.value
+                break
+            reply = None
+            if isinstance(event, AnswerCheckRequest):
+                reply = await self._acheck_answer(query, event.context)
+                yield AnswerChecked(event.node, *reply)
+            else:
+                yield event
+
+        if final_answer:
+            yield AnswerToken(final_answer)
+        else:
+            pieces = []
+            async for chunk in self.response_chain.astream({"query": query, "context": context}):
+                text = chunk.content if isinstance(chunk, AIMessage) else str(chunk)
+                if text:
+                    pieces.append(text)
+                    yield AnswerToken(text)
+            final_answer = "".join(pieces)
+
+        self.last_traversal_stats = stats
+        yield QueryCompleted(final_answer, traversal_path, filtered_content, stats)
+
+    async def aquery(self, query: str, query_embedding=None, return_stats=False):
+        """
+        Async version of query(). With return_stats=True the traversal stats of this query are
+        returned as a fourth element.
+        """
+        async for event in self.astream_query(query, query_embedding):
+            if isinstance(event, QueryCompleted):
+                result = (event.answer, event.traversal_path, event.filtered_content)
+                return result + (event.stats,) if return_stats else result
+
+    def _retrieve_seeds(self, query: str, query_embedding=None) -> List[Tuple[int, float]]:
+        """
+        Finds the traversal seed nodes and their priorities with a single vector search. The query is
+        embedded once (or query_embedding is reused) and each hit is mapped to its graph node. Priority is
+        the inverse cosine similarity between the query and the node's stored embedding, the same scale
+        as the 1 / weight edge costs used during traversal.
+        """
+        if query_embedding is None:
+            query_embedding = self.embedding_model.embed_query(query)
+        results = self.vector_store.similarity_search_by_vector_with_relevance_scores(
+            query_embedding, k=self.num_seed_documents
+        )
+
+        # Not in place: query_embedding may be the caller's float32 array
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        seeds = []
+        for document, _ in results:
+            node = self.knowledge_graph.node_for_document(document)
+            if node is None:
+                continue
+            node_vector = self.knowledge_graph.embeddings[node]
+            similarity_score = float(node_vector @ query_vector) / (float(np.linalg.norm(node_vector)) or 1.0)
+            # Initialize priority (inverse of similarity score for min-heap behavior)
+            seeds.append((node, 1 / max(similarity_score, 1e-6)))
+        return seeds
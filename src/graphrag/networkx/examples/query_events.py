@@ -0,0 +1,62 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+
+@dataclass
+class SeedsSelected:
+    """
+    The (node, priority) seeds the traversal starts from.
+    """
+    seeds: List[Tuple[int, float]]
+
+
+@dataclass
+class NodeVisited:
+    """
+    A node was added to the traversal path and its content to the context.
+    """
+    node: int
+    step: int
+    priority: float
+    content: str
+    context_tokens: int
+
+
+@dataclass
+class AnswerChecked:
+    """
+    Result of one answer-completeness check against the context gathered so far.
+    """
+    node: int
+    is_complete: bool
+    answer: str
+
+
+@dataclass
+class AnswerToken:
+    """
+    A piece of the final answer. When a completeness check already produced the answer it is
+    sent as a single token.
+    """
+    text: str
+
+
+@dataclass
+class QueryCompleted:
+    """
+    Last event of a query, carrying the same values GraphRAG.query returns plus the traversal stats.
+    """
+    answer: str
+    traversal_path: List[int]
+    filtered_content: Dict[int, str]
+    stats: Dict = field(default_factory=dict)
+
+
+@dataclass
+class AnswerCheckRequest:
+    """
+    Yielded by the traversal to its driver, which runs the check and sends back (is_complete, answer).
+    Never reaches stream_query callers.
+    """
+    node: int
+    context: str
@@ -1,29 +1,88 @@
 
+import os
+import json
+import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 
+from compact_graph import NetworkXGraphView
+
+# Local copy of the vis-network standalone build (vis-network@9.1.9/standalone/umd/vis-network.min.js). It is
+# inlined into the page, so rendering never fetches anything from a CDN; without it callers fall back to
+# visualize_density. The README shows how to download it.
+VIS_NETWORK_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "vis-network.min.js")
+
+# Renders a graph_payload() with vis-network; positions are fixed, so no physics simulation runs in the browser
+VIS_NETWORK_TEMPLATE = """<div id="graph" style="height: __HEIGHT__px; border: 1px solid lightgray;"></div>
+<script>__VIS_NETWORK__</script>
+<script>
+const payload = __PAYLOAD__;
+const path = new Set(payload.path);
+const nodes = payload.x.map((x, i) => ({id: i, x: x * 1000, y: payload.y[i] * 1000, size: path.has(i) ? 8 : 3,
+                                        color: path.has(i) ? "lightcoral" : "steelblue"}));
+const edges = payload.source.map((source, i) => ({from: source, to: payload.target[i],
+                                                  width: 0.5 + 2 * payload.weight[i]}));
+new vis.Network(document.getElementById("graph"), {nodes: new vis.DataSet(nodes), edges: new vis.DataSet(edges)}, {
+    physics: false,
+    nodes: {shape: "dot", borderWidth: 0},
+    edges: {smooth: false, color: {color: "gray", opacity: 0.3}},
+    interaction: {hideEdgesOnDrag: true, tooltipDelay: 100},
+});
+</script>
+"""
+
+
 class Visualizer:
     @staticmethod
-    def visualize_traversal(graph, traversal_path):
+    def neighbourhood(graph, nodes, hops=1):
         """
-        Visualizes the traversal path on the knowledge graph with nodes, edges, and traversal path highlighted.
+        Returns the subgraph of all nodes within `hops` edges of any of the given nodes.
+        """
+        selected = set(nodes)
+        frontier = set(nodes)
+        for _ in range(hops):
+            frontier = {neighbor for node in frontier for neighbor in graph.neighbors(node)} - selected
+            selected |= frontier
+        return graph.subgraph(selected)
+
+    @staticmethod
+    def _positions(graph, pos):
+        """
+        Accepts positions as a dict or as an (N, 2) array indexed by node, e.g. KnowledgeGraph.layout(),
+        and returns a dict for the nodes of graph. Without positions the spring layout is computed.
+        """
+        if pos is None:
+            return nx.spring_layout(graph, k=1, iterations=50)
+        return {node: pos[node] for node in graph.nodes()}
+
+    @staticmethod
+    def visualize_graph(graph, pos=None):
+        """
+        Draws the whole knowledge graph, using precomputed positions when given.
         """
-        traversal_graph = nx.DiGraph()
+        fig, ax = plt.subplots(figsize=(12, 8))
+        nx.draw(graph, Visualizer._positions(graph, pos), with_labels=True, ax=ax,
+                node_size=500, node_color="lightblue", edge_color="gray")
+        return fig, ax
 
-        # Add nodes and edges from the original graph
-        for node in graph.nodes():
-            traversal_graph.add_node(node)
-        for u, v, data in graph.edges(data=True):
-            traversal_graph.add_edge(u, v, **data)
+    @staticmethod
+    def visualize_traversal(graph, traversal_path, pos=None, hops=None):
+        """
+        Visualizes the traversal path on the knowledge graph with nodes, edges, and traversal path highlighted.
+        pos takes precomputed positions (see KnowledgeGraph.layout) instead of running a layout per call.
+        With hops set, only the nodes within that many edges of the traversal path are drawn, so the
+        drawing time depends on the traversal and not on the size of the graph.
+        """
+        traversal_graph = Visualizer.neighbourhood(graph, traversal_path, hops) if hops is not None else graph
 
         fig, ax = plt.subplots(figsize=(16, 12))
 
-        # Generate positions for all nodes
-        pos = nx.spring_layout(traversal_graph, k=1, iterations=50)
+        # Generate positions for all drawn nodes
+        pos = Visualizer._positions(traversal_graph, pos)
 
         # Draw regular edges with color based on weight
-        edges = traversal_graph.edges()
+        edges = list(traversal_graph.edges())
         edge_weights = [traversal_graph[u][v].get('weight', 0.5) for u, v in edges]
         nx.draw_networkx_edges(traversal_graph, pos,
                                edgelist=edges,
@@ -73,6 +132,10 @@ class Visualizer:
         nx.draw_networkx_labels(traversal_graph, pos, labels, font_size=8, font_weight="bold", ax=ax)
 
         # Highlight start and end nodes
+        if not traversal_path:
+            ax.set_title("Graph Traversal Flow")
+            ax.axis('off')
+            return fig, ax
         start_node = traversal_path[0]
         end_node = traversal_path[-1]
 
@@ -93,7 +156,8 @@ class Visualizer:
 
         # Add colorbar for edge weights
         sm = plt.cm.ScalarMappable(cmap=plt.cm.Blues,
-                                   norm=plt.Normalize(vmin=min(edge_weights), vmax=max(edge_weights)))
+                                   norm=plt.Normalize(vmin=min(edge_weights, default=0.0),
+                                                      vmax=max(edge_weights, default=1.0)))
         sm.set_array([])
         cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.046, pad=0.04)
         cbar.set_label('Edge Weight', rotation=270, labelpad=15)
@@ -111,3 +175,88 @@ class Visualizer:
 
         plt.tight_layout()
         return fig, ax
+
+    @staticmethod
+    def edge_arrays(graph):
+        """
+        Returns the (source, target, weight) arrays of a graph's undirected edges, once per edge. Accepts an
+        nx.Graph, a KnowledgeGraph.graph_view(), or a CompactGraph, whose CSR arrays are used directly.
+        """
+        if isinstance(graph, NetworkXGraphView):
+            graph = graph.graph
+        if hasattr(graph, "indptr"):
+            rows = np.repeat(np.arange(graph.number_of_nodes()), np.diff(graph.indptr))
+            upper = rows < graph.indices
+            return rows[upper], np.asarray(graph.indices[upper], dtype=np.int64), np.asarray(graph.weights[upper])
+        edges = list(graph.edges(data='weight', default=0.5))
+        return (np.fromiter((u for u, _, _ in edges), dtype=np.int64, count=len(edges)),
+                np.fromiter((v for _, v, _ in edges), dtype=np.int64, count=len(edges)),
+                np.fromiter((w for _, _, w in edges), dtype=np.float32, count=len(edges)))
+
+    @staticmethod
+    def graph_payload(graph, positions, max_edges=20_000, traversal_path=None, decimals=3):
+        """
+        Packs a large graph into a compact JSON-ready dict for a browser renderer: node positions as two
+        rounded coordinate lists and the max_edges strongest edges as parallel source/target/weight lists.
+        Weaker edges are decimated, as they would only add visual noise at this scale.
+        """
+        source, target, weight = Visualizer.edge_arrays(graph)
+        total_edges = len(weight)
+        if total_edges > max_edges:
+            keep = np.argpartition(-weight, max_edges - 1)[:max_edges]
+            source, target, weight = source[keep], target[keep], weight[keep]
+        positions = np.round(np.asarray(positions, dtype=np.float64), decimals)
+        return {"x": positions[:, 0].tolist(), "y": positions[:, 1].tolist(),
+                "source": source.tolist(), "target": target.tolist(), "weight": np.round(weight, 2).tolist(),
+                "total_edges": total_edges, "path": list(traversal_path or [])}
+
+    @staticmethod
+    def vis_network_html(payload, height=600, script_path=VIS_NETWORK_SCRIPT):
+        """
+        Returns a self-contained HTML page that draws a graph_payload() with vis-network, e.g. for
+        streamlit.components.v1.html. The vis-network script is read from script_path and inlined, so the
+        page works offline. Returns None when the script is not there; use visualize_density instead.
+        """
+        if not script_path or not os.path.exists(script_path):
+            return None
+        with open(script_path, encoding="utf-8") as f:
+            script = f.read().replace("</script", "<\\/script")
+        # The script goes in last, so placeholder-like text inside it is left alone
+        return (VIS_NETWORK_TEMPLATE.replace("__HEIGHT__", str(height))
+                .replace("__PAYLOAD__", json.dumps(payload, separators=(",", ":")))
+                .replace("__VIS_NETWORK__", script))
+
+    @staticmethod
+    def edge_density(graph, positions, resolution=512, samples_per_edge=16):
+        """
+        Rasterizes all edges into a resolution x resolution image where each pixel holds the summed weight
+        of the edges crossing it, sampling samples_per_edge points along every edge. Returns the image and
+        the (x_min, x_max, y_min, y_max) extent of the positions it covers.
+        """
+        source, target, weight = Visualizer.edge_arrays(graph)
+        positions = np.asarray(positions, dtype=np.float32)
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        scale = (resolution - 1) / np.maximum(high - low, 1e-9)
+        image = np.zeros(resolution * resolution, dtype=np.float64)
+        start, end = (positions[source] - low) * scale, (positions[target] - low) * scale
+        for t in np.linspace(0.0, 1.0, samples_per_edge, dtype=np.float32):
+            pixels = np.rint(start + t * (end - start)).astype(np.int64)
+            image += np.bincount(pixels[:, 1] * resolution + pixels[:, 0], weights=weight,
+                                 minlength=resolution * resolution)
+        return image.reshape(resolution, resolution), (low[0], high[0], low[1], high[1])
+
+    @staticmethod
+    def visualize_density(graph, positions, traversal_path=None, resolution=512):
+        """
+        Draws a large graph as an edge density image with the traversal path on top. Drawing cost depends on
+        the resolution, not on the number of edges.
+        """
+        image, extent = Visualizer.edge_density(graph, positions, resolution)
+        fig, ax = plt.subplots(figsize=(12, 8))
+        ax.imshow(np.log1p(image), origin="lower", extent=extent, cmap=plt.cm.Blues)
+        if traversal_path:
+            path_positions = np.asarray(positions)[traversal_path]
+            ax.plot(path_positions[:, 0], path_positions[:, 1], "o--", color="red", markersize=4, linewidth=1)
+        ax.set_title("Knowledge Graph Edge Density")
+        ax.axis('off')
+        return fig, ax